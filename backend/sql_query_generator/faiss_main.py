@@ -37,6 +37,15 @@ metrics_storage = {
     "total_queries": 0
 }
 
+# Separator lines and the closing warning of the schema prompt section
+_BANNER = '=' * 80
+_SCHEMA_SECTION_FOOTER = (
+    f"{_BANNER}\n"
+    "**CRITICAL: The user's database contains ONLY the tables listed above.**\n"
+    "**If you use a table name NOT in this list, the query will fail.**\n"
+    f"{_BANNER}\n\n"
+)
+
 # Get API keys
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
@@ -237,19 +246,18 @@ def generate_sql_query(user_query, context, dialect="trino", schema_context=None
         schema_section = ""
         if schema_context and schema_context.get('tables'):
             tables = schema_context['tables']
-            schema_section = f"\n{'='*80}\n"
-            schema_section += f"DATABASE SCHEMA - {len(tables)} TABLES AVAILABLE\n"
-            schema_section += f"{'='*80}\n\n"
-            schema_section += "**YOU MUST USE ONLY THESE TABLE NAMES - DO NOT MAKE UP TABLE NAMES:**\n\n"
+            schema_parts = [
+                f"\n{_BANNER}\n",
+                f"DATABASE SCHEMA - {len(tables)} TABLES AVAILABLE\n",
+                f"{_BANNER}\n\n",
+                "**YOU MUST USE ONLY THESE TABLE NAMES - DO NOT MAKE UP TABLE NAMES:**\n\n"
+            ]
             for table in tables[:20]:  # Limit to first 20 tables to avoid token limits
                 table_name = table.get('name', 'unknown')
                 columns = table.get('columns', 'N/A')
-                schema_section += f"TABLE: {table_name}\n"
-                schema_section += f"  Columns: {columns}\n\n"
-            schema_section += f"{'='*80}\n"
-            schema_section += "**CRITICAL: The user's database contains ONLY the tables listed above.**\n"
-            schema_section += "**If you use a table name NOT in this list, the query will fail.**\n"
-            schema_section += f"{'='*80}\n\n"
+                schema_parts.append(f"TABLE: {table_name}\n  Columns: {columns}\n\n")
+            schema_parts.append(_SCHEMA_SECTION_FOOTER)
+            schema_section = "".join(schema_parts)
         else:
             schema_section = ""
         
@@ -557,7 +565,7 @@ def process_query(user_query, dialect="trino", schema_context=None, project_id=N
 @app.route('/api/sql/query', methods=['POST'])
 def generate_sql_query_endpoint():
     """API endpoint to generate SQL queries for any supported dialect."""
-    start_time = time.time()
+    start_time = time.perf_counter_ns()
     
     try:
         # Get JSON input
@@ -597,7 +605,7 @@ def generate_sql_query_endpoint():
         
         # Process the query (passing schema context AND project_id for conversation context)
         result = process_query(user_query, dialect, schema_context=schema_context, project_id=project_id)
-        response_time = time.time() - start_time
+        response_time = (time.perf_counter_ns() - start_time) / 1e9
         
         if "error" in result:
             collect_query_metrics(user_query, dialect, result, response_time)
@@ -696,9 +704,16 @@ def get_metrics():
         else:
             avg_response_time = min_response_time = max_response_time = 0
         
+        # Per-query aggregates, gathered in a single pass over the stats
+        optimization_count = best_practices_total = docs_retrieved_total = 0
+        for q in query_stats_list:
+            if q.get('is_optimization', False):
+                optimization_count += 1
+            best_practices_total += q.get('best_practices_count', 0)
+            docs_retrieved_total += q.get('docs_retrieved', 0)
+        
         # Optimization statistics
-        optimization_queries = [q for q in query_stats_list if q.get('is_optimization', False)]
-        optimization_rate = (len(optimization_queries) / len(query_stats_list) * 100) if query_stats_list else 0
+        optimization_rate = (optimization_count / len(query_stats_list) * 100) if query_stats_list else 0
         
         # Dialect usage analysis
         dialect_stats = dict(metrics_storage["dialect_usage"])
@@ -706,8 +721,8 @@ def get_metrics():
         
         # Best practices analysis
         if query_stats_list:
-            avg_best_practices = sum(q.get('best_practices_count', 0) for q in query_stats_list) / len(query_stats_list)
-            avg_docs_retrieved = sum(q.get('docs_retrieved', 0) for q in query_stats_list) / len(query_stats_list)
+            avg_best_practices = best_practices_total / len(query_stats_list)
+            avg_docs_retrieved = docs_retrieved_total / len(query_stats_list)
         else:
             avg_best_practices = avg_docs_retrieved = 0
         
@@ -732,7 +747,7 @@ def get_metrics():
                 "performance_analysis": {
                     "avg_best_practices_per_query": round(avg_best_practices, 1),
                     "avg_docs_retrieved_per_query": round(avg_docs_retrieved, 1),
-                    "total_optimizations": len(optimization_queries)
+                    "total_optimizations": optimization_count
                 },
                 "recent_activity": recent_queries,
                 "system_health": {
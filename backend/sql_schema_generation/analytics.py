@@ -3,15 +3,94 @@ Schema Generation Analytics Module
 Advanced analytics for schema generation performance, patterns, and optimization
 """
 
-import time
-import json
+import orjson
 import sqlite3
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass
 from pathlib import Path
 import hashlib
 import re
+import atexit
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Patterns used by SchemaAnalytics.analyze_schema_content. Literal keywords
+# (CREATE TABLE, PRIMARY KEY, ...) are counted with str.count on an
+# upper-cased copy instead, so only the non-literal patterns live here.
+_COLUMN_RE = re.compile(
+    r'\w+\s+(?:VARCHAR|INTEGER|BIGINT|DECIMAL|TIMESTAMP|DATE|BOOLEAN|TEXT|SERIAL)',
+    re.IGNORECASE
+)
+_CHECK_RE = re.compile(r'CHECK\s*\(', re.IGNORECASE)
+
+# Requirement keywords per schema category, checked in order by
+# SchemaAnalytics.categorize_schema; the first category with a match wins
+_SCHEMA_CATEGORIES = (
+    ('e-commerce', ('product', 'order', 'cart', 'customer', 'payment', 'inventory', 'shipping')),
+    ('blog', ('post', 'comment', 'author', 'tag', 'category', 'article')),
+    ('financial', ('account', 'transaction', 'balance', 'payment', 'invoice', 'audit')),
+    ('user_management', ('user', 'auth', 'profile', 'permission', 'role')),
+    ('analytics', ('metric', 'event', 'tracking', 'report', 'dashboard')),
+    ('social', ('friend', 'message', 'follow', 'like', 'share', 'network')),
+    ('content', ('media', 'file', 'document', 'upload', 'attachment')),
+    ('hr', ('employee', 'department', 'salary', 'attendance', 'leave')),
+    ('education', ('student', 'course', 'grade', 'enrollment', 'teacher')),
+    ('healthcare', ('patient', 'doctor', 'appointment', 'medical', 'prescription'))
+)
+
+# Rows older than this many days are moved to monthly archive databases by
+# SchemaAnalytics.archive_old_metrics, so stats windows are capped to it
+RETENTION_DAYS = int(os.getenv('SCHEMA_ANALYTICS_RETENTION_DAYS', 90))
+
+def _dict_rows(cursor: sqlite3.Cursor) -> List[Dict]:
+    """Materialize a cursor as dicts keyed by the SQL column aliases"""
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+def _quality_scores(tables: int, constraints: int, indexes: int,
+                    has_fk: bool, has_unique: bool, has_check: bool,
+                    explanation_len: int, optimizations_len: int,
+                    mentions_performance: bool, mentions_scalability: bool) -> Tuple[float, ...]:
+    """Score a schema from its counts; returns the five sub-scores and their mean"""
+    # Normalization score (based on relationships and structure)
+    normalization_score = min(100, 
+        (has_fk * 40) +
+        (tables > 1) * 30 +
+        (constraints > tables) * 30
+    )
+    
+    # Constraint coverage (based on data integrity features)
+    constraint_coverage = min(100,
+        (has_fk * 25) +
+        (has_unique * 25) +
+        (has_check * 25) +
+        (constraints > 0) * 25
+    )
+    
+    # Indexing quality (based on performance considerations)
+    indexing_quality = min(100,
+        (indexes > 0) * 50 +
+        (indexes >= tables) * 50
+    )
+    
+    # Naming convention (basic heuristic)
+    naming_score = 85  # Default good score, could be enhanced with ML
+    
+    # Documentation quality (based on explanation length and detail)
+    doc_quality = min(100,
+        (explanation_len > 100) * 40 +
+        (optimizations_len > 50) * 30 +
+        mentions_performance * 15 +
+        mentions_scalability * 15
+    )
+    
+    overall_score = (normalization_score + constraint_coverage + indexing_quality + naming_score + doc_quality) / 5
+    return normalization_score, constraint_coverage, indexing_quality, naming_score, doc_quality, overall_score
 
 @dataclass
 class SchemaMetrics:
@@ -54,13 +133,40 @@ class SchemaQualityScore:
 class SchemaAnalytics:
     """Advanced analytics for schema generation performance and quality patterns"""
     
-    def __init__(self, db_path: str = "schema_analytics.db"):
+    def __init__(self, db_path: str = "schema_analytics.db", retention_days: int = RETENTION_DAYS):
         self.db_path = Path(db_path)
+        self.retention_days = retention_days
         self.init_database()
+        
+        # log_schema_generation_async calls, written by one background thread.
+        # The queue is created together with its writer, on first use in the
+        # process (after any fork and gevent monkey-patching)
+        self._write_queue = None
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        atexit.register(self.flush)
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection tuned for the append-mostly analytics workload.
+        
+        Connections run in autocommit mode (isolation_level=None); callers that
+        need several statements to land atomically issue BEGIN themselves.
+        """
+        conn = sqlite3.connect(self.db_path, isolation_level=None, detect_types=0)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA wal_autocheckpoint=1000")
+        return conn
     
     def init_database(self):
         """Initialize SQLite database for schema analytics"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
+            # page_size only takes effect before the first write, and must be
+            # set before switching the journal to WAL
+            conn.execute("PRAGMA page_size=8192")
+            conn.execute("PRAGMA journal_mode=WAL")
+            
             # Main metrics table
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS schema_metrics (
@@ -141,17 +247,18 @@ class SchemaAnalytics:
                 'has_foreign_keys': False, 'has_unique': False, 'has_check': False
             }
         
-        # Count SQL elements
-        table_count = len(re.findall(r'CREATE TABLE', schema_content, re.IGNORECASE))
-        column_count = len(re.findall(r'\w+\s+(?:VARCHAR|INTEGER|BIGINT|DECIMAL|TIMESTAMP|DATE|BOOLEAN|TEXT|SERIAL)', schema_content, re.IGNORECASE))
-        index_count = len(re.findall(r'CREATE INDEX', schema_content, re.IGNORECASE))
+        # Count SQL elements without materializing match lists
+        schema_upper = schema_content.upper()
+        table_count = schema_upper.count('CREATE TABLE')
+        column_count = sum(1 for _ in _COLUMN_RE.finditer(schema_content))
+        index_count = schema_upper.count('CREATE INDEX')
         
         # Count constraints
-        primary_keys = len(re.findall(r'PRIMARY KEY', schema_content, re.IGNORECASE))
-        foreign_keys = len(re.findall(r'FOREIGN KEY', schema_content, re.IGNORECASE))
-        unique_constraints = len(re.findall(r'UNIQUE', schema_content, re.IGNORECASE))
-        check_constraints = len(re.findall(r'CHECK\s*\(', schema_content, re.IGNORECASE))
-        not_null = len(re.findall(r'NOT NULL', schema_content, re.IGNORECASE))
+        primary_keys = schema_upper.count('PRIMARY KEY')
+        foreign_keys = schema_upper.count('FOREIGN KEY')
+        unique_constraints = schema_upper.count('UNIQUE')
+        check_constraints = sum(1 for _ in _CHECK_RE.finditer(schema_content))
+        not_null = schema_upper.count('NOT NULL')
         
         total_constraints = primary_keys + foreign_keys + unique_constraints + check_constraints + not_null
         
@@ -169,63 +276,26 @@ class SchemaAnalytics:
         """Categorize schema based on requirements"""
         requirements_lower = requirements.lower()
         
-        categories = {
-            'e-commerce': ['product', 'order', 'cart', 'customer', 'payment', 'inventory', 'shipping'],
-            'blog': ['post', 'comment', 'author', 'tag', 'category', 'article'],
-            'financial': ['account', 'transaction', 'balance', 'payment', 'invoice', 'audit'],
-            'user_management': ['user', 'auth', 'profile', 'permission', 'role'],
-            'analytics': ['metric', 'event', 'tracking', 'report', 'dashboard'],
-            'social': ['friend', 'message', 'follow', 'like', 'share', 'network'],
-            'content': ['media', 'file', 'document', 'upload', 'attachment'],
-            'hr': ['employee', 'department', 'salary', 'attendance', 'leave'],
-            'education': ['student', 'course', 'grade', 'enrollment', 'teacher'],
-            'healthcare': ['patient', 'doctor', 'appointment', 'medical', 'prescription']
-        }
-        
-        for category, keywords in categories.items():
+        for category, keywords in _SCHEMA_CATEGORIES:
             if any(keyword in requirements_lower for keyword in keywords):
                 return category
         
         return 'general'
     
-    def calculate_quality_score(self, schema_content: str, explanation: str, optimizations: str) -> SchemaQualityScore:
+    def calculate_quality_score(self, schema_content: str, explanation: str, optimizations: str,
+                                analysis: Optional[Dict] = None) -> SchemaQualityScore:
         """Calculate comprehensive quality score for generated schema"""
-        analysis = self.analyze_schema_content(schema_content)
-        
-        # Normalization score (based on relationships and structure)
-        normalization_score = min(100, 
-            (analysis['has_foreign_keys'] * 40) +
-            (analysis['tables'] > 1) * 30 +
-            (analysis['constraints'] > analysis['tables']) * 30
-        )
-        
-        # Constraint coverage (based on data integrity features)
-        constraint_coverage = min(100,
-            (analysis['has_foreign_keys'] * 25) +
-            (analysis['has_unique'] * 25) +
-            (analysis['has_check'] * 25) +
-            (analysis['constraints'] > 0) * 25
-        )
-        
-        # Indexing quality (based on performance considerations)
-        indexing_quality = min(100,
-            (analysis['indexes'] > 0) * 50 +
-            (analysis['indexes'] >= analysis['tables']) * 50
-        )
-        
-        # Naming convention (basic heuristic)
-        naming_score = 85  # Default good score, could be enhanced with ML
+        if analysis is None:
+            analysis = self.analyze_schema_content(schema_content)
+        explanation_lower = explanation.lower()
         
-        # Documentation quality (based on explanation length and detail)
-        doc_quality = min(100,
-            (len(explanation) > 100) * 40 +
-            (len(optimizations) > 50) * 30 +
-            ('performance' in explanation.lower()) * 15 +
-            ('scalability' in explanation.lower()) * 15
+        normalization_score, constraint_coverage, indexing_quality, naming_score, doc_quality, overall_score = _quality_scores(
+            analysis['tables'], analysis['constraints'], analysis['indexes'],
+            analysis['has_foreign_keys'], analysis['has_unique'], analysis['has_check'],
+            len(explanation), len(optimizations),
+            'performance' in explanation_lower, 'scalability' in explanation_lower
         )
         
-        overall_score = (normalization_score + constraint_coverage + indexing_quality + naming_score + doc_quality) / 5
-        
         return SchemaQualityScore(
             schema_id="",  # Will be set by caller
             normalization_score=normalization_score,
@@ -252,6 +322,60 @@ class SchemaAnalytics:
                             llm_model: str = "llama-3.3-70b",
                             dialect: str = "postgresql") -> str:
         """Log complete schema generation metrics"""
+        return self.log_schema_generation_bulk([dict(
+            requirements=requirements, schema_content=schema_content, explanation=explanation,
+            optimizations=optimizations, response_time=response_time, docs_retrieved=docs_retrieved,
+            docs_used=docs_used, success=success, error_message=error_message, user_id=user_id,
+            reranking_model=reranking_model, llm_model=llm_model, dialect=dialect
+        )])[0]
+    
+    def log_schema_generation_bulk(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """Log several generations (log_schema_generation keyword dicts) in one transaction"""
+        schema_ids = []
+        metrics_rows = []
+        quality_rows = []
+        for row in rows:
+            schema_id, metrics_row, quality_row = self._generation_rows(**row)
+            schema_ids.append(schema_id)
+            metrics_rows.append(metrics_row)
+            quality_rows.append(quality_row)
+        
+        # Log to database (metrics and quality scores in one transaction)
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            conn.executemany("""
+                INSERT OR REPLACE INTO schema_metrics 
+                (schema_id, user_requirements, response_time, docs_retrieved, docs_used,
+                 schema_complexity, total_columns, total_constraints, total_indexes,
+                 has_foreign_keys, has_unique_constraints, has_check_constraints,
+                 schema_size_chars, explanation_size_chars, optimization_size_chars,
+                 reranking_model, llm_model, success, error_message, timestamp, user_id, schema_category)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, metrics_rows)
+            conn.executemany("""
+                INSERT INTO schema_quality 
+                (schema_id, normalization_score, constraint_coverage, indexing_quality,
+                 naming_convention, documentation_quality, overall_score, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, quality_rows)
+        
+        return schema_ids
+    
+    def _generation_rows(self,
+                         requirements: str,
+                         schema_content: str,
+                         explanation: str,
+                         optimizations: str,
+                         response_time: float,
+                         docs_retrieved: int,
+                         docs_used: int,
+                         success: bool,
+                         error_message: Optional[str] = None,
+                         user_id: Optional[str] = None,
+                         reranking_model: str = "cohere",
+                         llm_model: str = "llama-3.3-70b",
+                         dialect: str = "postgresql") -> Tuple[str, tuple, tuple]:
+        """schema_id plus the schema_metrics and schema_quality rows for one generation"""
         
         # Generate unique schema ID
         schema_id = hashlib.md5(f"{requirements}{datetime.now().isoformat()}".encode()).hexdigest()[:12]
@@ -289,189 +413,298 @@ class SchemaAnalytics:
         )
         
         # Calculate quality score
-        quality_score = self.calculate_quality_score(schema_content, explanation, optimizations)
+        quality_score = self.calculate_quality_score(schema_content, explanation, optimizations, analysis)
         quality_score.schema_id = schema_id
         
-        # Log to database
-        with sqlite3.connect(self.db_path) as conn:
-            # Insert metrics
-            conn.execute("""
-                INSERT OR REPLACE INTO schema_metrics 
-                (schema_id, user_requirements, response_time, docs_retrieved, docs_used,
-                 schema_complexity, total_columns, total_constraints, total_indexes,
-                 has_foreign_keys, has_unique_constraints, has_check_constraints,
-                 schema_size_chars, explanation_size_chars, optimization_size_chars,
-                 reranking_model, llm_model, success, error_message, timestamp, user_id, schema_category)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                metrics.schema_id, metrics.user_requirements, metrics.response_time,
-                metrics.docs_retrieved, metrics.docs_used, metrics.schema_complexity,
-                metrics.total_columns, metrics.total_constraints, metrics.total_indexes,
-                metrics.has_foreign_keys, metrics.has_unique_constraints, metrics.has_check_constraints,
-                metrics.schema_size_chars, metrics.explanation_size_chars, metrics.optimization_size_chars,
-                metrics.reranking_model, metrics.llm_model, metrics.success,
-                metrics.error_message, metrics.timestamp, metrics.user_id, metrics.schema_category
-            ))
-            
-            # Insert quality score
-            conn.execute("""
-                INSERT INTO schema_quality 
-                (schema_id, normalization_score, constraint_coverage, indexing_quality,
-                 naming_convention, documentation_quality, overall_score, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                quality_score.schema_id, quality_score.normalization_score, quality_score.constraint_coverage,
-                quality_score.indexing_quality, quality_score.naming_convention, quality_score.documentation_quality,
-                quality_score.overall_score, quality_score.timestamp
-            ))
+        return schema_id, (
+            metrics.schema_id, metrics.user_requirements, metrics.response_time,
+            metrics.docs_retrieved, metrics.docs_used, metrics.schema_complexity,
+            metrics.total_columns, metrics.total_constraints, metrics.total_indexes,
+            metrics.has_foreign_keys, metrics.has_unique_constraints, metrics.has_check_constraints,
+            metrics.schema_size_chars, metrics.explanation_size_chars, metrics.optimization_size_chars,
+            metrics.reranking_model, metrics.llm_model, metrics.success,
+            metrics.error_message, metrics.timestamp, metrics.user_id, metrics.schema_category
+        ), (
+            quality_score.schema_id, quality_score.normalization_score, quality_score.constraint_coverage,
+            quality_score.indexing_quality, quality_score.naming_convention, quality_score.documentation_quality,
+            quality_score.overall_score, quality_score.timestamp
+        )
+    
+    def log_schema_generation_async(self, **kwargs) -> None:
+        """Queue a log_schema_generation call without waiting for the write.
         
-        return schema_id
+        A single writer thread drains the queue, so request threads never
+        block on SQLite and never contend with each other for its write lock.
+        """
+        with self._writer_lock:
+            # Threads don't survive fork, so a worker starts its own writer
+            if self._writer is None or not self._writer.is_alive():
+                self._write_queue = queue.SimpleQueue()
+                self._writer = threading.Thread(
+                    target=self._drain_writes, args=(self._write_queue,),
+                    name="schema-analytics-writer", daemon=True
+                )
+                self._writer.start()
+            self._write_queue.put(kwargs)
+    
+    def _drain_writes(self, write_queue: queue.SimpleQueue, max_batch: int = 100):
+        stopping = False
+        while not stopping:
+            # Block for one write, then take whatever else queued up meanwhile
+            # so a burst lands in a single transaction
+            batch = [write_queue.get()]
+            while len(batch) < max_batch:
+                try:
+                    batch.append(write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopping = True
+                batch = [kwargs for kwargs in batch if kwargs is not None]
+            if not batch:
+                continue
+            try:
+                schema_ids = self.log_schema_generation_bulk(batch)
+                logger.info("Analytics logged for schema IDs: %s", ", ".join(schema_ids))
+            except Exception as e:
+                logger.warning("Failed to log analytics for %d generations: %s", len(batch), e)
+    
+    def flush(self, timeout: float = 10.0):
+        """Write everything queued so far and stop the writer thread"""
+        with self._writer_lock:
+            writer = self._writer
+            if writer is None or not writer.is_alive():
+                return
+            self._write_queue.put(None)
+            self._writer = None
+        writer.join(timeout)
     
     def get_performance_stats(self, hours: int = 24, project_id: Optional[str] = None) -> Dict:
         """Get comprehensive performance statistics"""
+        with self._connect() as conn:
+            return self._performance_stats(conn, hours, project_id)
+    
+    def _performance_stats(self, conn: sqlite3.Connection, hours: int, project_id: Optional[str] = None) -> Dict:
+        hours = self._clamp_hours(hours)
         since = datetime.now() - timedelta(hours=hours)
         
-        with sqlite3.connect(self.db_path) as conn:
-            # Build query with optional project filter
-            base_where = "WHERE timestamp >= ?"
-            params = [since]
-            
-            if project_id:
-                base_where += " AND user_id = ?"
-                params.append(project_id)
-            
-            # Overall performance stats
-            overall = conn.execute(f"""
-                SELECT 
-                    COUNT(*) as total_schemas,
-                    AVG(response_time) as avg_response_time,
-                    AVG(schema_complexity) as avg_complexity,
-                    AVG(total_columns) as avg_columns,
-                    AVG(total_constraints) as avg_constraints,
-                    AVG(total_indexes) as avg_indexes,
-                    SUM(CASE WHEN success THEN 1 ELSE 0 END) * 100.0 / COUNT(*) as success_rate,
-                    SUM(CASE WHEN has_foreign_keys THEN 1 ELSE 0 END) * 100.0 / COUNT(*) as fk_usage_rate
-                FROM schema_metrics 
-                {base_where}
-            """, tuple(params)).fetchone()
-            
-            # Quality statistics
-            quality_stats = conn.execute(f"""
-                SELECT 
-                    AVG(sq.overall_score) as avg_quality_score,
-                    AVG(sq.normalization_score) as avg_normalization,
-                    AVG(sq.constraint_coverage) as avg_constraint_coverage,
-                    AVG(sq.indexing_quality) as avg_indexing_quality
-                FROM schema_quality sq
-                JOIN schema_metrics sm ON sq.schema_id = sm.schema_id
-                {base_where.replace('timestamp', 'sm.timestamp')}
-            """, tuple(params)).fetchone()
-            
-            # By category
-            by_category = conn.execute(f"""
-                SELECT 
-                    schema_category,
-                    COUNT(*) as count,
-                    AVG(response_time) as avg_response_time,
-                    AVG(schema_complexity) as avg_complexity
-                FROM schema_metrics 
-                {base_where} AND success = 1
-                GROUP BY schema_category
-                ORDER BY count DESC
-            """, tuple(params)).fetchall()
-            
-            # Complexity distribution
-            complexity_dist = conn.execute(f"""
-                SELECT 
-                    CASE 
-                        WHEN schema_complexity = 1 THEN 'Simple (1 table)'
-                        WHEN schema_complexity BETWEEN 2 AND 5 THEN 'Medium (2-5 tables)'
-                        WHEN schema_complexity BETWEEN 6 AND 10 THEN 'Complex (6-10 tables)'
-                        ELSE 'Very Complex (10+ tables)'
-                    END as complexity_level,
-                    COUNT(*) as count,
-                    AVG(response_time) as avg_response_time
-                FROM schema_metrics 
-                {base_where} AND success = 1
-                GROUP BY complexity_level
-            """, tuple(params)).fetchall()
+        # Build query with optional project filter
+        base_where = "WHERE timestamp >= ?"
+        params = [since]
+        
+        if project_id:
+            base_where += " AND user_id = ?"
+            params.append(project_id)
+        
+        # Overall performance stats
+        overall = _dict_rows(conn.execute(f"""
+            SELECT 
+                COUNT(*) as total_schemas,
+                AVG(response_time) as avg_response_time,
+                AVG(schema_complexity) as avg_complexity,
+                AVG(total_columns) as avg_columns,
+                AVG(total_constraints) as avg_constraints,
+                AVG(total_indexes) as avg_indexes,
+                SUM(CASE WHEN success THEN 1 ELSE 0 END) * 100.0 / COUNT(*) as success_rate,
+                SUM(CASE WHEN has_foreign_keys THEN 1 ELSE 0 END) * 100.0 / COUNT(*) as fk_usage_rate
+            FROM schema_metrics 
+            {base_where}
+        """, tuple(params)))
+        
+        # Quality statistics
+        quality_stats = _dict_rows(conn.execute(f"""
+            SELECT 
+                AVG(sq.overall_score) as avg_quality_score,
+                AVG(sq.normalization_score) as avg_normalization,
+                AVG(sq.constraint_coverage) as avg_constraint_coverage,
+                AVG(sq.indexing_quality) as avg_indexing_quality
+            FROM schema_quality sq
+            JOIN schema_metrics sm ON sq.schema_id = sm.schema_id
+            {base_where.replace('timestamp', 'sm.timestamp')}
+        """, tuple(params)))
+        
+        # By category
+        by_category = _dict_rows(conn.execute(f"""
+            SELECT 
+                schema_category as category,
+                COUNT(*) as count,
+                AVG(response_time) as avg_response_time,
+                AVG(schema_complexity) as avg_complexity
+            FROM schema_metrics 
+            {base_where} AND success = 1
+            GROUP BY schema_category
+            ORDER BY count DESC
+        """, tuple(params)))
+        
+        # Complexity distribution
+        complexity_dist = _dict_rows(conn.execute(f"""
+            SELECT 
+                CASE 
+                    WHEN schema_complexity = 1 THEN 'Simple (1 table)'
+                    WHEN schema_complexity BETWEEN 2 AND 5 THEN 'Medium (2-5 tables)'
+                    WHEN schema_complexity BETWEEN 6 AND 10 THEN 'Complex (6-10 tables)'
+                    ELSE 'Very Complex (10+ tables)'
+                END as level,
+                COUNT(*) as count,
+                AVG(response_time) as avg_response_time
+            FROM schema_metrics 
+            {base_where} AND success = 1
+            GROUP BY level
+        """, tuple(params)))
         
         return {
             'period_hours': hours,
-            'overall': dict(zip([
-                'total_schemas', 'avg_response_time', 'avg_complexity', 'avg_columns',
-                'avg_constraints', 'avg_indexes', 'success_rate', 'fk_usage_rate'
-            ], overall)) if overall else {},
-            'quality': dict(zip([
-                'avg_quality_score', 'avg_normalization', 'avg_constraint_coverage', 'avg_indexing_quality'
-            ], quality_stats)) if quality_stats else {},
-            'by_category': [dict(zip(['category', 'count', 'avg_response_time', 'avg_complexity'], row)) for row in by_category],
-            'complexity_distribution': [dict(zip(['level', 'count', 'avg_response_time'], row)) for row in complexity_dist]
+            'overall': overall[0] if overall else {},
+            'quality': quality_stats[0] if quality_stats else {},
+            'by_category': by_category,
+            'complexity_distribution': complexity_dist
         }
     
     def get_slow_generations(self, threshold: float = 10.0, limit: int = 10) -> List[Dict]:
         """Get slowest schema generations above threshold"""
-        with sqlite3.connect(self.db_path) as conn:
-            slow_schemas = conn.execute("""
-                SELECT user_requirements, response_time, schema_complexity, total_columns, timestamp
-                FROM schema_metrics 
-                WHERE response_time > ? AND success = 1
-                ORDER BY response_time DESC
-                LIMIT ?
-            """, (threshold, limit)).fetchall()
+        with self._connect() as conn:
+            return self._slow_generations(conn, threshold, limit)
+    
+    def _slow_generations(self, conn: sqlite3.Connection, threshold: float, limit: int) -> List[Dict]:
+        slow_schemas = conn.execute("""
+            SELECT user_requirements, response_time, schema_complexity, total_columns, timestamp
+            FROM schema_metrics 
+            WHERE response_time > ? AND success = 1
+            ORDER BY response_time DESC
+            LIMIT ?
+        """, (threshold, limit)).fetchall()
         
         return [dict(zip(['requirements', 'response_time', 'complexity', 'columns', 'timestamp'], row)) for row in slow_schemas]
     
     def get_top_quality_schemas(self, limit: int = 10) -> List[Dict]:
         """Get highest quality schema generations"""
-        with sqlite3.connect(self.db_path) as conn:
-            top_schemas = conn.execute("""
-                SELECT sm.user_requirements, sm.schema_complexity, sq.overall_score, sm.timestamp
-                FROM schema_metrics sm
-                JOIN schema_quality sq ON sm.schema_id = sq.schema_id
-                WHERE sm.success = 1
-                ORDER BY sq.overall_score DESC
-                LIMIT ?
-            """, (limit,)).fetchall()
+        with self._connect() as conn:
+            return self._top_quality_schemas(conn, limit)
+    
+    def _top_quality_schemas(self, conn: sqlite3.Connection, limit: int) -> List[Dict]:
+        top_schemas = conn.execute("""
+            SELECT sm.user_requirements, sm.schema_complexity, sq.overall_score, sm.timestamp
+            FROM schema_metrics sm
+            JOIN schema_quality sq ON sm.schema_id = sq.schema_id
+            WHERE sm.success = 1
+            ORDER BY sq.overall_score DESC
+            LIMIT ?
+        """, (limit,)).fetchall()
         
         return [dict(zip(['requirements', 'complexity', 'quality_score', 'timestamp'], row)) for row in top_schemas]
     
-    def export_analytics(self, hours: int = 24) -> str:
-        """Export comprehensive analytics as JSON"""
-        stats = self.get_performance_stats(hours)
-        slow_generations = self.get_slow_generations()
-        top_quality = self.get_top_quality_schemas()
+    def get_dashboard(self, hours: int = 24, top_n: int = 10, slow_threshold: float = 10.0,
+                      slow_limit: int = 10, trend_days: int = 7) -> Dict:
+        """Performance stats, top quality, slow generations and usage trends in one read.
+        
+        All four reports share one connection and one read transaction, so
+        they describe the same snapshot of the database.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            return {
+                'performance_stats': self._performance_stats(conn, hours),
+                'top_quality_schemas': self._top_quality_schemas(conn, top_n),
+                'slow_generations': self._slow_generations(conn, slow_threshold, slow_limit),
+                'usage_trends': self._usage_trends(conn, trend_days)
+            }
+    
+    def export_analytics_dict(self, hours: int = 24) -> Dict:
+        """Comprehensive analytics as a dict, for callers that don't need JSON"""
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            stats = self._performance_stats(conn, hours)
+            slow_generations = self._slow_generations(conn, 10.0, 10)
+            top_quality = self._top_quality_schemas(conn, 10)
         
-        return json.dumps({
+        return {
             'generated_at': datetime.now().isoformat(),
             'performance_stats': stats,
             'slow_generations': slow_generations,
             'top_quality_schemas': top_quality
-        }, indent=2)
+        }
+    
+    def export_analytics(self, hours: int = 24) -> bytes:
+        """Export comprehensive analytics as UTF-8 JSON"""
+        # Encoded straight to bytes, ready to be sent or written as is
+        return orjson.dumps(self.export_analytics_dict(hours), option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
     
     def get_usage_trends(self, days: int = 7) -> Dict:
         """Get usage trends over time"""
-        with sqlite3.connect(self.db_path) as conn:
-            daily_usage = conn.execute("""
-                SELECT 
-                    DATE(sm.timestamp) as date,
-                    COUNT(*) as schemas_generated,
-                    AVG(sm.response_time) as avg_response_time,
-                    AVG(sq.overall_score) as avg_quality
-                FROM schema_metrics sm
-                LEFT JOIN schema_quality sq ON sm.schema_id = sq.schema_id
-                WHERE sm.timestamp >= datetime('now', '-{} days')
-                GROUP BY DATE(sm.timestamp)
-                ORDER BY date DESC
-            """.format(days)).fetchall()
+        with self._connect() as conn:
+            return self._usage_trends(conn, days)
+    
+    def _usage_trends(self, conn: sqlite3.Connection, days: int) -> Dict:
+        days = min(days, self.retention_days)
+        daily_usage = conn.execute("""
+            SELECT 
+                DATE(sm.timestamp) as date,
+                COUNT(*) as schemas_generated,
+                AVG(sm.response_time) as avg_response_time,
+                AVG(sq.overall_score) as avg_quality
+            FROM schema_metrics sm
+            LEFT JOIN schema_quality sq ON sm.schema_id = sq.schema_id
+            WHERE sm.timestamp >= datetime('now', '-{} days')
+            GROUP BY DATE(sm.timestamp)
+            ORDER BY date DESC
+        """.format(days)).fetchall()
         
         return {
             'daily_trends': [dict(zip(['date', 'schemas_generated', 'avg_response_time', 'avg_quality'], row)) for row in daily_usage]
         }
     
+    def _clamp_hours(self, hours: int) -> int:
+        """Cap a stats window at the retention period; older rows are archived"""
+        return min(hours, self.retention_days * 24)
+    
+    def archive_old_metrics(self) -> Dict[str, int]:
+        """Move rows older than the retention period into monthly archive databases.
+        
+        Each month is written to schema_metrics_YYYYMM.db next to the main
+        database, so the live tables only hold the recent window the stats
+        queries scan. An archived month is dropped by deleting its file, and
+        can be queried again by ATTACHing it.
+        """
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        moved = {}
+        
+        with self._connect() as conn:
+            months = [row[0] for row in conn.execute("""
+                SELECT DISTINCT strftime('%Y%m', timestamp) FROM schema_metrics WHERE timestamp < ?
+                UNION
+                SELECT DISTINCT strftime('%Y%m', timestamp) FROM rag_analytics WHERE timestamp < ?
+            """, (cutoff, cutoff))]
+            
+            for month in months:
+                archive_path = self.db_path.parent / f"schema_metrics_{month}.db"
+                # ATTACH is not allowed inside a transaction
+                conn.execute("ATTACH DATABASE ? AS archive", (str(archive_path),))
+                try:
+                    conn.execute("BEGIN")
+                    count = 0
+                    for table in ('schema_metrics', 'schema_quality', 'rag_analytics'):
+                        conn.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0")
+                        count += conn.execute(f"""
+                            INSERT INTO archive.{table} SELECT * FROM main.{table}
+                            WHERE strftime('%Y%m', timestamp) = ? AND timestamp < ?
+                        """, (month, cutoff)).rowcount
+                        conn.execute(f"""
+                            DELETE FROM main.{table}
+                            WHERE strftime('%Y%m', timestamp) = ? AND timestamp < ?
+                        """, (month, cutoff))
+                    conn.execute("COMMIT")
+                    moved[month] = count
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                finally:
+                    conn.execute("DETACH DATABASE archive")
+        
+        return moved
+    
     def log_rag_metrics(self, schema_id: str, retrieval_metrics: Dict, rerank_metrics: Dict):
         """Log RAG pipeline performance metrics"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute("""
                 INSERT INTO rag_analytics 
                 (schema_id, retrieval_time, docs_retrieved, avg_retrieval_score,
@@ -494,9 +727,9 @@ class SchemaAnalytics:
     
     def get_rag_performance_stats(self, hours: int = 24) -> Dict:
         """Get RAG pipeline performance statistics"""
-        since = datetime.now() - timedelta(hours=hours)
+        since = datetime.now() - timedelta(hours=self._clamp_hours(hours))
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             stats = conn.execute("""
                 SELECT 
                     COUNT(*) as total_queries,
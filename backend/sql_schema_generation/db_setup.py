@@ -3,9 +3,10 @@ FAISS-based Schema Generation Database Setup
 Converts data.pdf into searchable vector embeddings for schema generation
 """
 
-import os
 import sys
+import math
 from pathlib import Path
+import faiss
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
@@ -15,6 +16,11 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Below this many vectors a brute-force flat scan is already fast and an IVF
+# index could not be trained well (faiss wants ~39 training points per list)
+IVF_MIN_VECTORS = 25000
+IVF_NPROBE = 16
+
 class SchemaVectorStore:
     """Handles FAISS vector store creation for schema generation"""
     
@@ -66,6 +72,7 @@ class SchemaVectorStore:
         
         # Create vector store
         vector_store = FAISS.from_documents(documents, self.embeddings)
+        vector_store.index = self.build_ann_index(vector_store.index)
         
         # Save locally
         vector_store.save_local(str(self.faiss_index_path))
@@ -73,6 +80,28 @@ class SchemaVectorStore:
         print(f"FAISS index saved to: {self.faiss_index_path}")
         return vector_store
     
+    def build_ann_index(self, flat_index):
+        """Replace a flat index with an IVF index once the corpus is large enough"""
+        n = flat_index.ntotal
+        if n < IVF_MIN_VECTORS:
+            print(f"Keeping flat index for {n} vectors")
+            return flat_index
+        
+        # ~4*sqrt(n) lists keeps each probed cell small without starving training;
+        # SQ8 stores each vector as one byte per dimension, 4x less than float32
+        nlist = int(4 * math.sqrt(n))
+        print(f"Building IVF{nlist},SQ8 index for {n} vectors...")
+        
+        # Vectors are re-added in their original order, so the docstore id
+        # mapping built by FAISS.from_documents stays valid
+        vectors = flat_index.reconstruct_n(0, n)
+        ivf_index = faiss.index_factory(flat_index.d, f"IVF{nlist},SQ8", flat_index.metric_type)
+        ivf_index.train(vectors)
+        ivf_index.add(vectors)
+        ivf_index.nprobe = IVF_NPROBE
+        
+        return ivf_index
+    
     def setup_complete_pipeline(self):
         """Complete setup pipeline for schema generation"""
         try:
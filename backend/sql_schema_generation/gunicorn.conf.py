@@ -0,0 +1,43 @@
+"""
+Gunicorn configuration for the Schema Generation API
+"""
+
+import os
+
+# With preload_app the master imports main_api before forking, so gevent has
+# to patch the stdlib before that import; otherwise the queues, locks, thread
+# pools and SSL contexts created at import are native and block a worker's hub
+if os.getenv('SCHEMA_API_WORKER_CLASS', 'gevent') == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+import multiprocessing
+
+bind = os.getenv('SCHEMA_API_BIND', '0.0.0.0:5001')
+
+# Requests spend most of their time waiting on Groq/Cohere, so gevent
+# workers let each process overlap many of them
+workers = int(os.getenv('SCHEMA_API_WORKERS', multiprocessing.cpu_count() * 2))
+worker_class = os.getenv('SCHEMA_API_WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('SCHEMA_API_WORKER_CONNECTIONS', 1000))
+
+# Every worker runs its own FAISS OpenMP pool, so split the cores between
+# them (one thread each at the default worker count) rather than letting
+# each worker spin up a pool sized to the whole host
+os.environ.setdefault('SCHEMA_FAISS_THREADS', str(max(1, multiprocessing.cpu_count() // workers)))
+
+# Import main_api (and load the FAISS index and embedding model) once in the
+# master so forked workers share those pages copy-on-write
+preload_app = True
+
+# LLM generations can take well over the default 30s
+timeout = int(os.getenv('SCHEMA_API_TIMEOUT', 120))
+graceful_timeout = 30
+
+# Hold idle HTTP/1.1 connections open longer than the usual 60s proxy/LB idle
+# timeout so the front end reuses them instead of reconnecting
+keepalive = int(os.getenv('SCHEMA_API_KEEPALIVE', 65))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('SCHEMA_API_LOG_LEVEL', 'info')
@@ -3,25 +3,51 @@ Schema Generation API Server
 Flask API for database schema generation using FAISS RAG
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
+from flask.json.provider import DefaultJSONProvider
 from schema_generator import SchemaGenerator
+from query_cache import QueryCache
 from analytics import schema_analytics
 import logging
 import time
-from datetime import datetime
 import sqlite3
 import os
 import redis
 import json
+import orjson
+import uuid
+import hashlib
+import hmac
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes responses and parses request bodies with orjson"""
+    
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_SERIALIZE_DATACLASS | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Initialize Flask app
 app = Flask(__name__)
-CORS(app)  # Enable CORS for cross-origin requests
+app.json = OrjsonProvider(app)
+# Enable CORS for cross-origin requests, except on the token-gated admin endpoints
+CORS(app, resources={r"/(?!admin/).*": {"origins": "*"}})
+
+# Admin endpoints refuse every request unless this token is configured
+ADMIN_TOKEN = os.getenv('SCHEMA_ADMIN_TOKEN')
 
 # Initialize schema generator
 schema_generator = SchemaGenerator()
@@ -40,6 +66,18 @@ except Exception as e:
     print(f"⚠️ Redis connection failed: {e}")
     redis_client = None
 
+# Response timestamps have second resolution, so the formatted string is
+# rebuilt at most once per second and shared by every request in between
+_TS_CACHE = (0, "")
+
+def _iso_now():
+    """Current UTC time as an ISO-8601 string, cached per second"""
+    global _TS_CACHE
+    now = int(time.time())
+    if now != _TS_CACHE[0]:
+        _TS_CACHE = (now, time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now)))
+    return _TS_CACHE[1]
+
 def get_conversation_context(project_id):
     """
     Fetch conversation history from Redis to get context from Query Generator.
@@ -55,7 +93,7 @@ def get_conversation_context(project_id):
         if not session_data:
             return None
         
-        conversation = json.loads(session_data)
+        conversation = orjson.loads(session_data)
         messages = conversation.get('messages', [])
         
         # Extract queries from previous Query Generator responses
@@ -91,7 +129,7 @@ def health_check():
         
         return jsonify({
             "status": "healthy",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": _iso_now(),
             "services": {
                 "vector_store": vector_store_status,
                 "groq_llm": groq_status,
@@ -105,10 +143,169 @@ def health_check():
             "error": str(e)
         }), 500
 
+def parse_schema_request(data):
+    """
+    Validate a schema generation request body.
+    Returns (params, None), or (None, error_message) when the request should be rejected.
+    """
+    requirements = data.get('requirements', '').strip()
+    dialect = data.get('dialect', 'postgresql').lower()
+    
+    # Map "analytics" dialect to "trino" (frontend abstraction)
+    if dialect == 'analytics':
+        dialect = 'trino'
+        logger.info("📊 Analytics dialect detected, mapping to Trino")
+    
+    # NEW: Accept project context from frontend
+    project_id = data.get('project_id')
+    project_name = data.get('project_name')
+    existing_schema = data.get('existing_schema')  # Current database schema
+    
+    # Log context received
+    if project_id:
+        logger.info("📋 Processing schema generation for project: %s (ID: %s)", project_name, project_id)
+        if existing_schema and existing_schema.get('tables'):
+            logger.info("   📊 Existing schema: %s tables", existing_schema.get('totalTables', 0))
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("   📊 Existing schema tables: %s...", [t.get('name') for t in existing_schema.get('tables', [])[:5]])
+        else:
+            logger.info("   📊 No existing schema provided (existing_schema=%s)", existing_schema)
+    
+    # Validate requirements
+    if not requirements:
+        return None, "Requirements field is required and cannot be empty"
+    
+    # Validate dialect
+    supported_dialects = ['mysql', 'postgresql', 'trino', 'spark']
+    if dialect not in supported_dialects:
+        return None, f"Unsupported dialect: {dialect}. Supported dialects: {', '.join(supported_dialects)}"
+    
+    return {
+        'requirements': requirements,
+        'dialect': dialect,
+        'project_id': project_id,
+        'project_name': project_name,
+        'existing_schema': existing_schema
+    }, None
+
+# Identical requests that arrive while a generation is already running wait
+# for that run instead of issuing their own retrieval + LLM round trip
+inflight_lock = threading.Lock()
+inflight_generations = {}
+
+def schema_request_key(requirements, dialect, conversation_context, existing_schema):
+    """Stable hash of every input that shapes a generated schema"""
+    payload = json.dumps(
+        [requirements, dialect, conversation_context, existing_schema],
+        sort_keys=True, default=str
+    )
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+def coalesced_generate(key, generate):
+    """Run generate() once per key among concurrent callers and share its result"""
+    with inflight_lock:
+        future = inflight_generations.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            inflight_generations[key] = future
+    
+    if is_leader:
+        try:
+            future.set_result(generate())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with inflight_lock:
+                inflight_generations.pop(key, None)
+    else:
+        logger.info("⏳ Joining in-flight schema generation %.8s", key)
+    
+    # Each caller decorates its own copy with request metadata
+    return dict(future.result())
+
+# Successful generations are kept in an LRU so repeated requests (retries,
+# dev/test loops) skip retrieval and the LLM entirely
+RESULT_CACHE_SIZE = int(os.getenv('SCHEMA_RESULT_CACHE_SIZE', 512))
+RESULT_CACHE_TTL = int(os.getenv('SCHEMA_RESULT_CACHE_TTL', 86400))
+result_cache = QueryCache(max_size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+def get_cached_result(key):
+    """Return a cached generator result, marking it most recently used"""
+    return result_cache.get(key)
+
+def cache_result(key, result):
+    """Store a successful generator result, evicting the least recently used"""
+    if result.get('success'):
+        result_cache.put(key, result)
+
+def cached_generate(key, generate):
+    """Serve a request from the result cache, generating (once) on a miss"""
+    cached = get_cached_result(key)
+    if cached is not None:
+        logger.info("⚡ Schema result cache hit %.8s", key)
+        return dict(cached)
+    
+    def generate_and_cache():
+        result = generate()
+        cache_result(key, result)
+        return result
+    
+    return coalesced_generate(key, generate_and_cache)
+
+def run_schema_generation(params, start_time):
+    """Run the schema generator for a validated request and attach API metadata"""
+    requirements = params['requirements']
+    dialect = params['dialect']
+    project_id = params['project_id']
+    
+    logger.info("Received schema generation request for %s: %.100s...", dialect, requirements)
+    
+    # Fetch conversation context from Redis (previous queries)
+    conversation_context = get_conversation_context(project_id)
+    
+    # Generate schema with dialect support, conversation context, AND existing schema
+    existing_schema = params['existing_schema']
+    key = schema_request_key(requirements, dialect, conversation_context, existing_schema)
+    result = cached_generate(key, lambda: schema_generator.generate_schema(
+        requirements, dialect, conversation_context, existing_schema, project_id
+    ))
+    
+    # Add API metadata
+    result['api_response_time'] = (time.perf_counter_ns() - start_time) / 1e9
+    result['timestamp'] = _iso_now()
+    result['project_id'] = project_id
+    result['project_name'] = params['project_name']
+    
+    return result
+
+# Results whose text fields stay under this size are sent in one buffer;
+# larger ones are streamed key by key so the first bytes go out early
+STREAM_THRESHOLD = 64 * 1024
+LARGE_RESULT_FIELDS = ('schema', 'explanation', 'optimizations', 'best_practices', 'generated_content')
+
+def stream_json_object(result):
+    """Yield a dict as JSON, small metadata keys first and large text fields last"""
+    keys = [k for k in result if k not in LARGE_RESULT_FIELDS]
+    keys += [k for k in LARGE_RESULT_FIELDS if k in result]
+    
+    yield '{'
+    for i, key in enumerate(keys):
+        prefix = ',' if i else ''
+        yield f"{prefix}{json.dumps(key)}:{app.json.dumps(result[key])}"
+    yield '}'
+
+def schema_response(result):
+    """Serialize a schema generation result, streaming it when it is large"""
+    size = sum(len(result[k]) for k in LARGE_RESULT_FIELDS if isinstance(result.get(k), str))
+    if size < STREAM_THRESHOLD:
+        return jsonify(result)
+    return Response(stream_with_context(stream_json_object(result)), mimetype='application/json')
+
 @app.route('/generate-schema', methods=['POST'])
 def generate_schema():
     """Generate database schema from requirements with multi-dialect support"""
-    start_time = time.time()
+    start_time = time.perf_counter_ns()
     
     try:
         # Validate request
@@ -118,75 +315,182 @@ def generate_schema():
                 "error": "Request must be JSON"
             }), 400
         
-        data = request.get_json()
-        requirements = data.get('requirements', '').strip()
-        dialect = data.get('dialect', 'postgresql').lower()
+        params, error = parse_schema_request(request.get_json())
+        if error:
+            return jsonify({
+                "success": False,
+                "error": error
+            }), 400
+        
+        result = run_schema_generation(params, start_time)
         
-        # Map "analytics" dialect to "trino" (frontend abstraction)
-        if dialect == 'analytics':
-            dialect = 'trino'
-            logger.info("📊 Analytics dialect detected, mapping to Trino")
+        # TODO: Save conversation to Redis via SQL Execution backend
+        # if project_id:
+        #     session_id = data.get("session_id", "default_session")
+        #     save_ai_conversation(project_id, session_id, requirements, result)
         
-        # NEW: Accept project context from frontend
-        project_id = data.get('project_id')
-        project_name = data.get('project_name')
-        existing_schema = data.get('existing_schema')  # Current database schema
+        return schema_response(result)
         
-        # Log context received
-        if project_id:
-            logger.info(f"📋 Processing schema generation for project: {project_name} (ID: {project_id})")
-            if existing_schema and existing_schema.get('tables'):
-                logger.info(f"   📊 Existing schema: {existing_schema.get('totalTables', 0)} tables")
-                logger.info(f"   📊 Existing schema tables: {[t.get('name') for t in existing_schema.get('tables', [])[:5]]}...")
-            else:
-                logger.info(f"   📊 No existing schema provided (existing_schema={existing_schema})")
+    except Exception as e:
+        logger.error("Error in schema generation: %s", e, exc_info=True)
         
-        # Validate requirements
-        if not requirements:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": _iso_now()
+        }), 500
+
+# Background schema generation jobs. Generation blocks on FAISS, Cohere and
+# Groq for several seconds, so clients that cannot hold a request open that
+# long submit a job and poll for the result instead. Job state lives in Redis
+# when available so any worker process can answer the poll.
+SCHEMA_JOB_TTL = 3600  # seconds
+schema_job_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('SCHEMA_JOB_WORKERS', 4)),
+    thread_name_prefix='schema-job'
+)
+local_jobs = {}  # Fallback job store when Redis is unavailable
+
+def save_job(job_id, job):
+    """Persist job state to Redis, or to the in-process store as a fallback"""
+    if redis_client:
+        try:
+            redis_client.setex(f"schema_job:{job_id}", SCHEMA_JOB_TTL, orjson.dumps(job))
+            return
+        except Exception as e:
+            logger.warning("⚠️ Could not store job %s in Redis: %s", job_id, e)
+    
+    now = time.time()
+    for stale_id in [k for k, (saved_at, _) in local_jobs.items() if now - saved_at > SCHEMA_JOB_TTL]:
+        local_jobs.pop(stale_id, None)
+    local_jobs[job_id] = (now, job)
+
+def load_job(job_id):
+    """Fetch job state, or None if the job is unknown or expired"""
+    if redis_client:
+        try:
+            job_data = redis_client.get(f"schema_job:{job_id}")
+            if job_data:
+                return orjson.loads(job_data)
+        except Exception as e:
+            logger.warning("⚠️ Could not read job %s from Redis: %s", job_id, e)
+    
+    entry = local_jobs.get(job_id)
+    return entry[1] if entry else None
+
+def run_schema_job(job_id, params):
+    """Worker body for a queued schema generation"""
+    save_job(job_id, {"job_id": job_id, "status": "running", "updated_at": _iso_now()})
+    try:
+        result = run_schema_generation(params, time.perf_counter_ns())
+        save_job(job_id, {"job_id": job_id, "status": "completed", "result": result, "updated_at": _iso_now()})
+    except Exception as e:
+        logger.error("Error in schema generation job %s: %s", job_id, e, exc_info=True)
+        save_job(job_id, {"job_id": job_id, "status": "failed", "error": str(e), "updated_at": _iso_now()})
+
+def sse_event(event):
+    """Format a generator event as a Server-Sent Events frame"""
+    return f"event: {event['event']}\ndata: {app.json.dumps(event)}\n\n"
+
+@app.route('/generate-schema/stream', methods=['POST'])
+def generate_schema_stream():
+    """Generate a schema, streaming sections as Server-Sent Events while the LLM writes them"""
+    start_time = time.perf_counter_ns()
+    
+    if not request.is_json:
+        return jsonify({
+            "success": False,
+            "error": "Request must be JSON"
+        }), 400
+    
+    params, error = parse_schema_request(request.get_json())
+    if error:
+        return jsonify({
+            "success": False,
+            "error": error
+        }), 400
+    
+    requirements = params['requirements']
+    dialect = params['dialect']
+    project_id = params['project_id']
+    existing_schema = params['existing_schema']
+    logger.info("Received streaming schema generation request for %s: %.100s...", dialect, requirements)
+    
+    conversation_context = get_conversation_context(project_id)
+    key = schema_request_key(requirements, dialect, conversation_context, existing_schema)
+    
+    def events():
+        try:
+            for event in schema_generator.generate_schema_stream(
+                requirements, dialect, conversation_context, existing_schema, project_id
+            ):
+                if event['event'] == 'done':
+                    # Completed streams also serve later identical non-streaming requests
+                    cache_result(key, event['result'])
+                    result = dict(event['result'])
+                    result['api_response_time'] = (time.perf_counter_ns() - start_time) / 1e9
+                    result['timestamp'] = _iso_now()
+                    result['project_id'] = project_id
+                    result['project_name'] = params['project_name']
+                    event = {"event": "done", "result": result}
+                yield sse_event(event)
+        except Exception as e:
+            logger.error("Error in streaming schema generation: %s", e, exc_info=True)
+            yield sse_event({"event": "error", "result": {"success": False, "error": str(e)}})
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/generate-schema/jobs', methods=['POST'])
+def submit_schema_job():
+    """Queue a schema generation and return a job id to poll"""
+    try:
+        if not request.is_json:
             return jsonify({
                 "success": False,
-                "error": "Requirements field is required and cannot be empty"
+                "error": "Request must be JSON"
             }), 400
         
-        # Validate dialect
-        supported_dialects = ['mysql', 'postgresql', 'trino', 'spark']
-        if dialect not in supported_dialects:
+        params, error = parse_schema_request(request.get_json())
+        if error:
             return jsonify({
                 "success": False,
-                "error": f"Unsupported dialect: {dialect}. Supported dialects: {', '.join(supported_dialects)}"
+                "error": error
             }), 400
         
-        logger.info(f"Received schema generation request for {dialect}: {requirements[:100]}...")
-        
-        # Fetch conversation context from Redis (previous queries)
-        conversation_context = get_conversation_context(project_id)
-        
-        # Generate schema with dialect support, conversation context, AND existing schema
-        result = schema_generator.generate_schema(requirements, dialect, conversation_context, existing_schema, project_id)
-        
-        # Add API metadata
-        result['api_response_time'] = time.time() - start_time
-        result['timestamp'] = datetime.now().isoformat()
-        result['project_id'] = project_id
-        result['project_name'] = project_name
+        job_id = uuid.uuid4().hex
+        save_job(job_id, {"job_id": job_id, "status": "queued", "updated_at": _iso_now()})
+        schema_job_pool.submit(run_schema_job, job_id, params)
         
-        # TODO: Save conversation to Redis via SQL Execution backend
-        # if project_id:
-        #     session_id = data.get("session_id", "default_session")
-        #     save_ai_conversation(project_id, session_id, requirements, result)
-        
-        return jsonify(result)
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/generate-schema/jobs/{job_id}"
+        }), 202
         
     except Exception as e:
-        error_msg = str(e)
-        logger.error(f"Error in schema generation: {error_msg}")
-        
+        logger.error("Error queueing schema generation: %s", e, exc_info=True)
         return jsonify({
             "success": False,
-            "error": error_msg,
-            "timestamp": datetime.now().isoformat()
+            "error": str(e),
+            "timestamp": _iso_now()
         }), 500
 
+@app.route('/generate-schema/jobs/<job_id>', methods=['GET'])
+def get_schema_job(job_id):
+    """Poll a queued schema generation job"""
+    job = load_job(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": f"Unknown or expired job: {job_id}"
+        }), 404
+    return jsonify(job)
+
 @app.route('/analytics', methods=['GET'])
 def get_analytics():
     """Get comprehensive schema generation analytics"""
@@ -196,7 +500,7 @@ def get_analytics():
         stats = schema_analytics.get_performance_stats(hours, project_id)
         return jsonify(stats)
     except Exception as e:
-        logger.error(f"Error getting analytics: {str(e)}")
+        logger.error("Error getting analytics: %s", e, exc_info=True)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/analytics/rag', methods=['GET'])
@@ -207,7 +511,110 @@ def get_rag_analytics():
         stats = schema_analytics.get_rag_performance_stats(hours)
         return jsonify(stats)
     except Exception as e:
-        logger.error(f"Error getting RAG analytics: {str(e)}")
+        logger.error("Error getting RAG analytics: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analytics/quality', methods=['GET'])
+def get_quality_analytics():
+    """Get the highest quality schema generations"""
+    try:
+        limit = request.args.get('limit', 10, type=int)
+        return jsonify(schema_analytics.get_top_quality_schemas(limit))
+    except Exception as e:
+        logger.error("Error getting quality analytics: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analytics/slow', methods=['GET'])
+def get_slow_analytics():
+    """Get the slowest schema generations above a response time threshold"""
+    try:
+        threshold = request.args.get('threshold', 10.0, type=float)
+        limit = request.args.get('limit', 10, type=int)
+        return jsonify(schema_analytics.get_slow_generations(threshold, limit))
+    except Exception as e:
+        logger.error("Error getting slow generation analytics: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analytics/trends', methods=['GET'])
+def get_trend_analytics():
+    """Get daily usage trends"""
+    try:
+        days = request.args.get('days', 7, type=int)
+        return jsonify(schema_analytics.get_usage_trends(days))
+    except Exception as e:
+        logger.error("Error getting usage trends: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analytics/dashboard', methods=['GET'])
+def get_dashboard_analytics():
+    """Get performance stats, top quality, slow generations and usage trends in one call"""
+    try:
+        return jsonify(schema_analytics.get_dashboard(
+            hours=request.args.get('hours', 24, type=int),
+            top_n=request.args.get('limit', 10, type=int),
+            slow_threshold=request.args.get('threshold', 10.0, type=float),
+            slow_limit=request.args.get('limit', 10, type=int),
+            trend_days=request.args.get('days', 7, type=int)
+        ))
+    except Exception as e:
+        logger.error("Error getting analytics dashboard: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analytics/export', methods=['GET'])
+def export_analytics():
+    """Export performance stats, slow generations and top quality schemas as JSON"""
+    try:
+        hours = request.args.get('hours', 24, type=int)
+        return Response(schema_analytics.export_analytics(hours), mimetype='application/json')
+    except Exception as e:
+        logger.error("Error exporting analytics: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+def admin_authorized():
+    """Whether the request carries the configured admin token"""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+@app.route('/admin/cache/clear', methods=['POST'])
+def clear_result_cache():
+    """Drop this worker's cached schema results, retrievals and reranks, and the LLM responses.
+    
+    The in-memory caches are per process: under Gunicorn only the worker that
+    serves the request is cleared, so repeat it (or restart) to reach the rest.
+    """
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    
+    cleared = result_cache.clear()
+    schema_generator.query_cache.clear()
+    schema_generator.rerank_cache.clear()
+    llm_responses_cleared = schema_generator.response_cache.clear()
+    
+    logger.info("🧹 Cleared %d cached schema results and %d LLM responses", cleared, llm_responses_cleared)
+    return jsonify({
+        "success": True,
+        "cleared": cleared,
+        "llm_responses_cleared": llm_responses_cleared
+    })
+
+@app.route('/admin/analytics/archive', methods=['POST'])
+def archive_analytics():
+    """Move analytics rows older than the retention period into monthly archive databases"""
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    
+    try:
+        # Pending async writes land in the live tables before they are archived
+        schema_analytics.flush()
+        archived = schema_analytics.archive_old_metrics()
+        logger.info("📦 Archived analytics rows older than %d days: %s", schema_analytics.retention_days, archived)
+        return jsonify({
+            "success": True,
+            "retention_days": schema_analytics.retention_days,
+            "archived": archived
+        })
+    except Exception as e:
+        logger.error("Error archiving analytics: %s", e, exc_info=True)
         return jsonify({"error": str(e)}), 500
 
 
@@ -221,7 +628,18 @@ def not_found(error):
         "available_endpoints": [
             "/health - Health check",
             "/generate-schema - Generate database schema (POST)",
-            "/analytics - View generation analytics"
+            "/generate-schema/stream - Generate a schema as Server-Sent Events (POST)",
+            "/generate-schema/jobs - Queue a schema generation job (POST)",
+            "/generate-schema/jobs/<job_id> - Poll a schema generation job",
+            "/analytics - View generation analytics",
+            "/analytics/rag - View RAG pipeline analytics",
+            "/analytics/quality - Top quality schemas",
+            "/analytics/slow - Slowest generations",
+            "/analytics/trends - Daily usage trends",
+            "/analytics/dashboard - Stats, quality, slow generations and trends in one call",
+            "/analytics/export - Export analytics as JSON",
+            "/admin/cache/clear - Clear this worker's cached schema results (POST, X-Admin-Token)",
+            "/admin/analytics/archive - Archive analytics older than the retention period (POST, X-Admin-Token)"
         ]
     }), 404
 
@@ -247,14 +665,23 @@ def main():
     print("📍 Available endpoints:")
     print("   GET  /health - Health check")
     print("   POST /generate-schema - Generate database schema")
+    print("   POST /generate-schema/stream - Stream schema generation (SSE)")
+    print("   POST /generate-schema/jobs - Queue a schema generation job")
+    print("   GET  /generate-schema/jobs/<job_id> - Poll a queued job")
     print("   GET  /analytics - View performance analytics")
+    print("   GET  /analytics/rag|quality|slow|trends|dashboard|export - Detailed analytics")
+    print("   POST /admin/cache/clear - Clear this worker's cached schema results (X-Admin-Token)")
+    print("   POST /admin/analytics/archive - Archive analytics older than the retention period (X-Admin-Token)")
     print("\n📖 API Documentation:")
     print("   POST /generate-schema")
     print("   Body: {\"requirements\": \"Your schema requirements here\"}")
-    print("\n🌐 Starting server on http://localhost:5001")
+    print("\n🏭 For production, run under Gunicorn instead:")
+    print("   gunicorn -c gunicorn.conf.py wsgi:application")
+    print("\n🌐 Starting development server on http://localhost:5001")
     
-    # Run Flask app
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    # Run Flask development server
+    debug = os.getenv('FLASK_DEBUG', '0').lower() in ('1', 'true', 'yes')
+    app.run(host='0.0.0.0', port=5001, debug=debug)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
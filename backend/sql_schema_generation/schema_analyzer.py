@@ -3,16 +3,39 @@ Schema Analyzer
 Analyzes existing database schemas and provides optimization recommendations
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import sqlite3
 import re
 from dataclasses import dataclass
 from datetime import datetime
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# DDL patterns, compiled once at import
+_CREATE_TABLE_RE = re.compile(r'CREATE\s+TABLE\s+(\w+)\s*\((.*?)\)(?:;|\s*$)', re.IGNORECASE | re.DOTALL)
+_COLUMN_DELIM_RE = re.compile(r'[(),]')
+_INLINE_PK_RE = re.compile(r'PRIMARY\s+KEY', re.IGNORECASE)
+# Table-level PRIMARY KEY (first column of a composite key) and FOREIGN KEY
+# constraints, found in one scan
+_CONSTRAINT_RE = re.compile(
+    r'PRIMARY\s+KEY\s*\(\s*(?P<pk_col>\w+)\s*[,)]'
+    r'|FOREIGN\s+KEY\s*\(\s*(?P<fk_col>\w+)\s*\)\s+REFERENCES\s+(?P<ref_table>\w+)\s*\(\s*(?P<ref_col>\w+)\s*\)',
+    re.IGNORECASE
+)
+
+# snake_case check (^[a-z][a-z0-9_]*$) done with byte tables instead of the regex VM
+_SNAKE_FIRST = b'abcdefghijklmnopqrstuvwxyz'
+_SNAKE_CHARS = _SNAKE_FIRST + b'0123456789_'
+
+def _is_snake(name: str) -> bool:
+    """True if name is lowercase snake_case starting with a letter"""
+    b = name.encode()
+    # Deleting every allowed byte leaves nothing behind for a valid name
+    return bool(b) and b[0] in _SNAKE_FIRST and not b.translate(None, _SNAKE_CHARS)
+
+@dataclass(slots=True)
 class TableAnalysis:
     """Analysis result for a database table"""
     table_name: str
@@ -24,7 +47,7 @@ class TableAnalysis:
     issues: List[str]
     recommendations: List[str]
 
-@dataclass
+@dataclass(slots=True)
 class SchemaAnalysisResult:
     """Complete schema analysis result"""
     total_tables: int
@@ -39,14 +62,6 @@ class SchemaAnalysisResult:
 class SchemaAnalyzer:
     """Analyzes database schemas and provides optimization recommendations"""
     
-    def __init__(self):
-        self.analysis_patterns = {
-            'naming_convention': r'^[a-z][a-z0-9_]*$',
-            'primary_key_pattern': r'.*_id$|^id$',
-            'foreign_key_pattern': r'.*_id$',
-            'index_pattern': r'^idx_|^ix_'
-        }
-    
     def analyze_ddl_statements(self, ddl_statements: str) -> SchemaAnalysisResult:
         """Analyze DDL statements and provide recommendations"""
         try:
@@ -54,28 +69,21 @@ class SchemaAnalyzer:
             tables = self.parse_ddl_statements(ddl_statements)
             
             # Analyze each table
-            table_analyses = []
-            total_columns = 0
-            total_issues = 0
-            
-            for table in tables:
-                analysis = self.analyze_table(table)
-                table_analyses.append(analysis)
-                total_columns += analysis.column_count
-                total_issues += len(analysis.issues)
+            table_analyses = [self.analyze_table(table) for table in tables]
+            metrics = self.table_metrics(table_analyses)
             
             # Calculate performance score
-            performance_score = self.calculate_performance_score(table_analyses)
+            performance_score = self.calculate_performance_score(table_analyses, metrics)
             
             # Generate global recommendations
-            global_recommendations = self.generate_global_recommendations(table_analyses)
+            global_recommendations = self.generate_global_recommendations(table_analyses, metrics)
             optimization_opportunities = self.find_optimization_opportunities(table_analyses)
             
             return SchemaAnalysisResult(
                 total_tables=len(tables),
-                total_columns=total_columns,
-                relationships=self.count_relationships(table_analyses),
-                issues_found=total_issues,
+                total_columns=int(metrics['column_counts'].sum()),
+                relationships=self.count_relationships(table_analyses, metrics),
+                issues_found=int(metrics['issue_counts'].sum()),
                 performance_score=performance_score,
                 table_analyses=table_analyses,
                 global_recommendations=global_recommendations,
@@ -91,10 +99,7 @@ class SchemaAnalyzer:
         tables = []
         
         # Split by CREATE TABLE statements
-        create_table_pattern = r'CREATE\s+TABLE\s+(\w+)\s*\((.*?)\)(?:;|\s*$)'
-        matches = re.finditer(create_table_pattern, ddl, re.IGNORECASE | re.DOTALL)
-        
-        for match in matches:
+        for match in _CREATE_TABLE_RE.finditer(ddl):
             table_name = match.group(1).strip()
             columns_str = match.group(2).strip()
             
@@ -102,8 +107,7 @@ class SchemaAnalyzer:
             columns = self.parse_columns(columns_str)
             
             # Extract constraints
-            primary_key = self.extract_primary_key(columns_str)
-            foreign_keys = self.extract_foreign_keys(columns_str)
+            primary_key, foreign_keys = self.extract_constraints(columns_str, columns)
             
             tables.append({
                 'name': table_name,
@@ -123,18 +127,21 @@ class SchemaAnalyzer:
         
         for line in column_lines:
             line = line.strip()
-            if not line or line.upper().startswith(('PRIMARY KEY', 'FOREIGN KEY', 'CONSTRAINT')):
+            line_upper = line.upper()
+            if not line or line_upper.startswith(('PRIMARY KEY', 'FOREIGN KEY', 'CONSTRAINT')):
                 continue
             
             # Extract column name and type
             parts = line.split()
             if len(parts) >= 2:
-                column_name = parts[0].strip()
-                column_type = parts[1].strip()
+                column_name = parts[0]
+                column_type = parts[1]
                 
                 columns.append({
                     'name': column_name,
                     'type': column_type,
+                    # Uppercased once here rather than on every check
+                    'type_upper': column_type.upper(),
                     'definition': line
                 })
         
@@ -143,57 +150,57 @@ class SchemaAnalyzer:
     def split_columns(self, columns_str: str) -> List[str]:
         """Split column definitions by commas, handling nested parentheses"""
         result = []
-        current = ""
+        start = 0
         paren_depth = 0
         
-        for char in columns_str:
+        # Jump straight between delimiters and slice, rather than walking and
+        # concatenating every character
+        for match in _COLUMN_DELIM_RE.finditer(columns_str):
+            char = match.group()
             if char == '(':
                 paren_depth += 1
             elif char == ')':
                 paren_depth -= 1
-            elif char == ',' and paren_depth == 0:
-                result.append(current.strip())
-                current = ""
-                continue
-            
-            current += char
+            elif paren_depth == 0:
+                result.append(columns_str[start:match.start()].strip())
+                start = match.end()
         
-        if current.strip():
-            result.append(current.strip())
+        tail = columns_str[start:].strip()
+        if tail:
+            result.append(tail)
         
         return result
     
+    def extract_constraints(self, columns_str: str,
+                            columns: Optional[List[Dict[str, str]]] = None) -> Tuple[Optional[str], List[str]]:
+        """Extract the primary key and foreign keys from a table body in one pass"""
+        primary_key = None
+        foreign_keys = []
+        
+        for match in _CONSTRAINT_RE.finditer(columns_str):
+            if match.group('fk_col'):
+                foreign_keys.append(f"{match.group('fk_col')} -> {match.group('ref_table')}.{match.group('ref_col')}")
+            elif primary_key is None:
+                primary_key = match.group('pk_col')
+        
+        # Check for inline PRIMARY KEY on an already-parsed column
+        if primary_key is None:
+            if columns is None:
+                columns = self.parse_columns(columns_str)
+            for column in columns:
+                if _INLINE_PK_RE.search(column['definition']):
+                    primary_key = column['name']
+                    break
+        
+        return primary_key, foreign_keys
+    
     def extract_primary_key(self, columns_str: str) -> Optional[str]:
         """Extract primary key from column definitions"""
-        pk_pattern = r'PRIMARY\s+KEY\s*\(\s*(\w+)\s*\)'
-        match = re.search(pk_pattern, columns_str, re.IGNORECASE)
-        
-        if match:
-            return match.group(1)
-        
-        # Check for inline PRIMARY KEY
-        inline_pk_pattern = r'(\w+)\s+\w+.*PRIMARY\s+KEY'
-        match = re.search(inline_pk_pattern, columns_str, re.IGNORECASE)
-        
-        if match:
-            return match.group(1)
-        
-        return None
+        return self.extract_constraints(columns_str)[0]
     
     def extract_foreign_keys(self, columns_str: str) -> List[str]:
         """Extract foreign keys from column definitions"""
-        foreign_keys = []
-        
-        fk_pattern = r'FOREIGN\s+KEY\s*\(\s*(\w+)\s*\)\s+REFERENCES\s+(\w+)\s*\(\s*(\w+)\s*\)'
-        matches = re.finditer(fk_pattern, columns_str, re.IGNORECASE)
-        
-        for match in matches:
-            fk_column = match.group(1)
-            ref_table = match.group(2)
-            ref_column = match.group(3)
-            foreign_keys.append(f"{fk_column} -> {ref_table}.{ref_column}")
-        
-        return foreign_keys
+        return self.extract_constraints(columns_str)[1]
     
     def analyze_table(self, table: Dict[str, Any]) -> TableAnalysis:
         """Analyze a single table"""
@@ -206,7 +213,7 @@ class SchemaAnalyzer:
         foreign_keys = table['foreign_keys']
         
         # Check naming conventions
-        if not re.match(self.analysis_patterns['naming_convention'], table_name):
+        if not _is_snake(table_name):
             issues.append(f"Table name '{table_name}' doesn't follow snake_case convention")
         
         # Check for primary key
@@ -218,13 +225,14 @@ class SchemaAnalyzer:
         for column in columns:
             column_name = column['name']
             column_type = column['type']
+            column_type_upper = column.get('type_upper') or column_type.upper()
             
             # Check column naming
-            if not re.match(self.analysis_patterns['naming_convention'], column_name):
+            if not _is_snake(column_name):
                 issues.append(f"Column '{column_name}' doesn't follow naming convention")
             
             # Check for VARCHAR without length
-            if 'VARCHAR' in column_type.upper() and '(' not in column_type:
+            if 'VARCHAR' in column_type_upper and '(' not in column_type:
                 issues.append(f"VARCHAR column '{column_name}' should specify length")
                 recommendations.append(f"Specify appropriate length for VARCHAR column '{column_name}'")
         
@@ -246,49 +254,51 @@ class SchemaAnalyzer:
             recommendations=recommendations
         )
     
-    def calculate_performance_score(self, table_analyses: List[TableAnalysis]) -> float:
+    def table_metrics(self, table_analyses: List[TableAnalysis]) -> Dict[str, np.ndarray]:
+        """Collect the per-table fields used for scoring into parallel arrays"""
+        n = len(table_analyses)
+        return {
+            'column_counts': np.fromiter((a.column_count for a in table_analyses), dtype=np.int32, count=n),
+            'issue_counts': np.fromiter((len(a.issues) for a in table_analyses), dtype=np.int32, count=n),
+            'has_pk': np.fromiter((bool(a.primary_key) for a in table_analyses), dtype=np.bool_, count=n),
+            'fk_counts': np.fromiter((len(a.foreign_keys) for a in table_analyses), dtype=np.int32, count=n)
+        }
+    
+    def calculate_performance_score(self, table_analyses: List[TableAnalysis],
+                                    metrics: Optional[Dict[str, np.ndarray]] = None) -> float:
         """Calculate overall performance score (0-100)"""
         if not table_analyses:
             return 0.0
         
-        total_score = 0
-        max_score = 0
+        if metrics is None:
+            metrics = self.table_metrics(table_analyses)
         
-        for analysis in table_analyses:
-            # Scoring criteria
-            table_score = 100
-            table_max = 100
-            
-            # Deduct points for issues
-            table_score -= len(analysis.issues) * 10
-            
-            # Bonus for having primary key
-            if analysis.primary_key:
-                table_score += 10
-                table_max += 10
-            
-            # Ensure score doesn't go below 0
-            table_score = max(0, table_score)
-            
-            total_score += table_score
-            max_score += table_max
+        # Each table starts at 100, loses 10 per issue and gains 10 (on both
+        # score and max) for having a primary key; scores floor at 0
+        pk_bonus = metrics['has_pk'] * 10
+        table_scores = np.maximum(100 - metrics['issue_counts'] * 10 + pk_bonus, 0)
+        max_score = int((100 + pk_bonus).sum())
         
-        return (total_score / max_score) * 100 if max_score > 0 else 0.0
+        return float(table_scores.sum() / max_score * 100)
     
-    def count_relationships(self, table_analyses: List[TableAnalysis]) -> int:
+    def count_relationships(self, table_analyses: List[TableAnalysis],
+                            metrics: Optional[Dict[str, np.ndarray]] = None) -> int:
         """Count total relationships in the schema"""
-        total_relationships = 0
-        for analysis in table_analyses:
-            total_relationships += len(analysis.foreign_keys)
-        return total_relationships
+        if metrics is None:
+            metrics = self.table_metrics(table_analyses)
+        return int(metrics['fk_counts'].sum())
     
-    def generate_global_recommendations(self, table_analyses: List[TableAnalysis]) -> List[str]:
+    def generate_global_recommendations(self, table_analyses: List[TableAnalysis],
+                                        metrics: Optional[Dict[str, np.ndarray]] = None) -> List[str]:
         """Generate schema-wide recommendations"""
         recommendations = []
         
+        if metrics is None:
+            metrics = self.table_metrics(table_analyses)
+        
         # Check for tables without relationships
-        isolated_tables = [a.table_name for a in table_analyses if not a.foreign_keys]
-        if len(isolated_tables) > len(table_analyses) * 0.5:
+        isolated_tables = int((metrics['fk_counts'] == 0).sum())
+        if isolated_tables > len(table_analyses) * 0.5:
             recommendations.append("Many tables lack relationships - consider if normalization is needed")
         
         # Check for naming consistency
@@ -297,10 +307,8 @@ class SchemaAnalyzer:
             recommendations.append("Inconsistent table naming convention - standardize on snake_case")
         
         # Performance recommendations
-        total_columns = sum(a.column_count for a in table_analyses)
-        avg_columns = total_columns / len(table_analyses)
-        
-        if avg_columns > 15:
+        column_counts = metrics['column_counts']
+        if column_counts.size and column_counts.mean() > 15:
             recommendations.append("High average column count - consider table normalization")
         
         return recommendations
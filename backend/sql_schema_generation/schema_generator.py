@@ -4,16 +4,31 @@ Generates database schemas using RAG with FAISS vector store
 """
 
 from langchain_community.vectorstores import FAISS
+import faiss
+import numpy as np
+import contextlib
+import copy
+import pickle
+import hashlib
+import sqlite3
 from langchain_huggingface import HuggingFaceEmbeddings
-from groq import Groq
+from groq import Groq, AsyncGroq
 import cohere
+import httpx
+import importlib.util
+import asyncio
+import threading
+import weakref
 from pathlib import Path
+from types import MappingProxyType
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from dotenv import load_dotenv
 import time
 import logging
+import re
 from analytics import schema_analytics
+from query_cache import QueryCache
 
 # Load environment variables
 load_dotenv()
@@ -22,37 +37,713 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-request diagnostics (existing-schema checks, prompt previews) are logged
+# at DEBUG; SCHEMA_DEBUG=1 turns them on
+if os.getenv('SCHEMA_DEBUG', '0').lower() in ('1', 'true', 'yes'):
+    logger.setLevel(logging.DEBUG)
+
+LLM_MODEL = "llama-3.3-70b-versatile"
+RERANK_MODELS = [
+    "rerank-english-v3.0",
+    "rerank-english-v2.0", 
+    "rerank-multilingual-v3.0"
+]
+
+# A rerank slower than this (seconds) is abandoned and the retrieval order used
+# instead, so a struggling Cohere endpoint can't stall generation
+RERANK_TIMEOUT = float(os.getenv('SCHEMA_RERANK_TIMEOUT', 2.0))
+
+# Completion budget: sized from the request between these bounds instead of a
+# flat 2000. Groq counts max_tokens against the tokens-per-minute limit, and
+# the floor leaves room for all four response sections
+MAX_TOKENS_FLOOR = int(os.getenv('SCHEMA_MAX_TOKENS_FLOOR', 1200))
+MAX_TOKENS_CAP = int(os.getenv('SCHEMA_MAX_TOKENS_CAP', 2000))
+
+# Upper bound on concurrent generations in agenerate_schemas
+ASYNC_MAX_CONCURRENCY = int(os.getenv('SCHEMA_ASYNC_MAX_CONCURRENCY', 8))
+
+# Flat (brute-force) indexes at least this large are rebuilt as HNSW graphs
+# over 8-bit scalar-quantized vectors at load time; smaller ones are already
+# fast enough to scan exhaustively
+HNSW_MIN_VECTORS = int(os.getenv('SCHEMA_HNSW_MIN_VECTORS', 25000))
+HNSW_M = 32
+HNSW_EF_SEARCH = int(os.getenv('SCHEMA_HNSW_EF_SEARCH', 64))
+# The rebuilt index is saved next to db_setup's exact index.faiss, which is
+# left untouched so the full-precision vectors are never lost
+UPGRADED_INDEX_FILE = "index.hnsw_sq8.faiss"
+
+# OpenMP threads FAISS spreads a (batched) search over. Capped at 8 for a
+# single process; gunicorn.conf.py lowers it to the cores per worker
+FAISS_THREADS = int(os.getenv('SCHEMA_FAISS_THREADS', min(8, os.cpu_count() or 1)))
+
+# Requirements whose embeddings are at least this similar reuse each other's
+# reranked documents
+SEMANTIC_CACHE_SIZE = int(os.getenv('SCHEMA_SEMANTIC_CACHE_SIZE', 256))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SCHEMA_SEMANTIC_CACHE_THRESHOLD', 0.97))
+
+# Query embeddings run MiniLM under ONNX Runtime, by default with the int8
+# dynamically quantized export shipped in the model repo. It is the same
+# pooling and normalization as PyTorch, so the vectors still match the FAISS
+# index. SCHEMA_EMBEDDINGS_BACKEND=torch (or a missing onnxruntime) falls back
+# to PyTorch fp32
+EMBEDDINGS_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDINGS_BACKEND = os.getenv('SCHEMA_EMBEDDINGS_BACKEND', 'onnx')
+EMBEDDINGS_ONNX_FILE = os.getenv('SCHEMA_EMBEDDINGS_ONNX_FILE', 'onnx/model_qint8_avx512_vnni.onnx')
+EMBEDDINGS_DEVICE = os.getenv('SCHEMA_EMBEDDINGS_DEVICE', 'cpu')
+
+# Groq and Cohere clients share one keep-alive connection pool (per event loop
+# for the async clients), so warm connections are reused instead of each SDK
+# opening and TLS-handshaking its own. HTTP/2 is used when h2 is installed
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=50, max_connections=100)
+HTTP_TIMEOUT = httpx.Timeout(60.0)
+HTTP2 = importlib.util.find_spec('h2') is not None
+
+# Retrieved documents (and the query embedding) for recently seen
+# requirements, keyed by the exact text and k
+QUERY_CACHE_SIZE = int(os.getenv('SCHEMA_QUERY_CACHE_SIZE', 512))
+QUERY_CACHE_TTL = float(os.getenv('SCHEMA_QUERY_CACHE_TTL', 300))
+
+# Raw LLM responses are kept on disk for this long (seconds); 0 disables the cache
+RESPONSE_CACHE_TTL = int(os.getenv('SCHEMA_RESPONSE_CACHE_TTL', 7 * 24 * 3600))
+# ...and the most recent of them in process memory, so a repeated prompt
+# doesn't even touch the SQLite file
+RESPONSE_MEMORY_CACHE_SIZE = int(os.getenv('SCHEMA_RESPONSE_MEMORY_CACHE_SIZE', 256))
+RESPONSE_MEMORY_CACHE_TTL = 3600
+
+# System prompts are fixed per dialect and built once, so every request for a
+# dialect sends a byte-identical prefix the provider can reuse from its KV cache
+_BASE_SYSTEM_PROMPT = """You are an expert database architect specializing in schema design and optimization.
+        
+Your responses should be:
+1. Technically accurate and follow database best practices
+2. Include proper data types, constraints, and indexing strategies
+3. Consider performance, scalability, and maintainability
+4. Provide clear explanations for design decisions
+
+Format your response as:
+[SCHEMA]
+<DDL statements - PLAIN TEXT ONLY, NO MARKDOWN CODE FENCES, NO ```sql or ``` markers>
+[EXPLANATION]
+<Design rationale and best practices>
+[OPTIMIZATIONS]
+<Performance recommendations>
+[BEST_PRACTICES]
+<Categorized best practices with title, description, category>
+
+**CRITICAL: In the [SCHEMA] section, write ONLY pure SQL DDL statements. Do NOT wrap them in markdown code blocks (```sql). Write raw SQL only.**
+"""
+
+_DIALECT_REQUIREMENTS = {
+    'mysql': """
+MYSQL SPECIFIC REQUIREMENTS:
+- Use AUTO_INCREMENT for primary keys, never SERIAL
+- Specify ENGINE=InnoDB for ACID compliance
+- Use appropriate MySQL data types (INT, VARCHAR, TEXT, DATETIME)
+- Add DEFAULT CHARSET=utf8mb4 for full Unicode support
+- Use UNIQUE KEY and INDEX syntax specific to MySQL
+- Consider partitioning for large tables
+- Include proper foreign key constraints with ON DELETE/UPDATE actions
+- Use TIMESTAMP DEFAULT CURRENT_TIMESTAMP for audit fields""",
+    
+    'postgresql': """
+POSTGRESQL SPECIFIC REQUIREMENTS:
+- Use SERIAL or IDENTITY columns for auto-incrementing primary keys
+- Leverage JSONB for flexible JSON storage with indexing
+- Use appropriate PostgreSQL data types (BIGSERIAL, TIMESTAMPTZ, ARRAY)
+- Include proper constraints (CHECK, UNIQUE, FOREIGN KEY)
+- Use GENERATED ALWAYS AS for computed columns where applicable
+- Use CREATE INDEX CONCURRENTLY for production environments
+- Implement proper schema organization with namespaces
+
+POSTGRESQL PARTITIONING RULES (CRITICAL):
+- Partition key expressions MUST use IMMUTABLE functions only
+- WRONG: PARTITION BY RANGE (EXTRACT(YEAR FROM created_at)) - will fail!
+- CORRECT: PARTITION BY RANGE (created_at) - partition directly on timestamp column
+- CORRECT: Add generated column first: year INTEGER GENERATED ALWAYS AS (EXTRACT(YEAR FROM created_at)::INTEGER) STORED, then PARTITION BY RANGE (year)
+- When partitioning by date/time, use the timestamp column directly, not functions
+- Create child partitions separately after the main table with FOR VALUES FROM/TO""",
+    
+    'trino': """
+TRINO SPECIFIC REQUIREMENTS:
+- NO auto-increment columns (Trino doesn't support them)
+- Use BIGINT for ID columns with manual sequence generation
+- Design for distributed queries across multiple data sources
+- Include proper partitioning strategies (especially for Hive connector)
+- Use appropriate data types for the target connector
+- Consider bucketing for join optimization
+- Design schemas for cross-catalog queries
+- Include table properties for connector-specific optimizations
+- Focus on columnar storage optimization""",
+    
+    'spark': """
+SPARK SQL SPECIFIC REQUIREMENTS:
+- Design for Delta tables with ACID transactions
+- NO auto-increment (use monotonically_increasing_id() or UUID)
+- Include partitioning columns for distributed performance
+- Use appropriate Spark SQL data types (BIGINT, STRING, TIMESTAMP)
+- Consider schema evolution and backward compatibility
+- Design for both batch and streaming workloads
+- Include table properties for Delta optimizations
+- Use proper data layout for query performance
+- Consider Z-ordering for frequently queried columns"""
+}
+
+_SYSTEM_PROMPTS = MappingProxyType({
+    dialect: _BASE_SYSTEM_PROMPT + requirements
+    for dialect, requirements in _DIALECT_REQUIREMENTS.items()
+})
+
+# Read-only, so results can hand out the shared tuples without copying
+_DIALECT_FEATURES = MappingProxyType({
+    'mysql': (
+        'AUTO_INCREMENT', 'InnoDB Engine', 'MyISAM Engine', 'CHARSET utf8mb4',
+        'Partitioning', 'Foreign Keys', 'Full-text Indexing', 'JSON data type'
+    ),
+    'postgresql': (
+        'SERIAL/IDENTITY', 'JSONB', 'Array Types', 'CTEs', 'Window Functions',
+        'Table Partitioning', 'Concurrent Indexing', 'Schemas/Namespaces'
+    ),
+    'trino': (
+        'Cross-catalog Queries', 'Connector-based', 'Distributed Joins',
+        'Bucketing', 'Table Properties', 'Columnar Storage', 'Push-down Optimization'
+    ),
+    'spark': (
+        'Delta Tables', 'Schema Evolution', 'Partitioning', 'Z-ordering',
+        'ACID Transactions', 'Time Travel', 'Streaming Support', 'Broadcast Joins'
+    )
+})
+
+_SUPPORTED_DIALECTS = frozenset(_DIALECT_FEATURES)
+
+# User prompt skeletons, filled with str.format per request
+_BANNER = '=' * 80
+
+_EXISTING_SCHEMA_HEADER = f"""
+{_BANNER}
+EXISTING DATABASE SCHEMA - {{table_count}} TABLES
+{_BANNER}
+
+**The database currently has these tables:**
+
+"""
+
+_EXISTING_SCHEMA_INSTRUCTIONS = f"""{_BANNER}
+**CRITICAL INSTRUCTIONS - MUST FOLLOW:**
+1. The database ALREADY HAS these tables - DO NOT recreate them
+2. ONLY create NEW tables that are requested
+3. Use foreign keys to reference existing table IDs (e.g., user_id references users, product_id references products)
+4. Follow the existing naming conventions (e.g., if tables use plural names, continue that pattern)
+5. Keep it SIMPLE - do not add unnecessary OLAP, data warehouse, or complex structures unless specifically requested
+6. Match the existing column naming style and data types
+{_BANNER}
+
+"""
+
+_PROMPT_DELIVERABLES = """1. CREATE TABLE statements with {dialect}-appropriate data types
+2. Primary keys, foreign keys, and constraints specific to {dialect}
+3. Indexing strategies optimized for {dialect}
+4. Partitioning recommendations if applicable for {dialect}
+5. Best practices specific to {dialect} database
+
+Focus on {dialect}-specific performance, scalability, and maintainability features."""
+
+_EXTENSION_PROMPT_TEMPLATE = """You are extending an existing database schema.
+
+{existing_schema_section}
+
+**USER REQUEST:** {requirements}
+{conversation_section}
+
+Target Database: {dialect_upper}
+Dialect Features: {dialect_features}
+
+**YOUR TASK:**
+Create ONLY the NEW tables requested. DO NOT recreate existing tables. Keep it simple and focused.
+
+Design guidelines:
+1. Create minimal tables needed to fulfill the request
+2. Reference existing tables using foreign keys (user_id → users.id, product_id → products.id, etc.)
+3. Match existing naming patterns and data types
+4. Use appropriate {dialect_upper} syntax and features
+
+Reference documentation (use only if helpful for syntax/features):
+{context}...
+
+Please provide:
+""" + _PROMPT_DELIVERABLES
+
+_NEW_SCHEMA_PROMPT_TEMPLATE = """Based on the following database design documentation:
+
+{context}
+
+Target Database: {dialect_upper}
+Dialect Features: {dialect_features}
+
+Requirements: {requirements}
+{conversation_section}
+
+Please design an optimal {dialect_upper} database schema including:
+""" + _PROMPT_DELIVERABLES
+
+# Separators between the entities a requirements string lists
+# ("users, products and orders"), a cheap proxy for how many tables it needs
+_ENTITY_SEPARATOR_RE = re.compile(r',|;|\n|\band\b', re.IGNORECASE)
+
+# ```sql and ``` fences around the DDL in an LLM response, stripped in one pass
+_FENCE_RE = re.compile(r'```(?:sql)?')
+
+# Extension prompts only carry the start of the retrieved context
+_EXTENSION_CONTEXT_CHARS = 500
+
+# Keywords that file a best practice under performance or security
+_PERF_RE = re.compile(r'index|performance|optimize|speed')
+_SEC_RE = re.compile(r'security|auth|permission|access')
+
+# Section markers of the structured LLM response, in the order they appear
+_SECTION_MARKERS = {
+    '[SCHEMA]': 'schema',
+    '[EXPLANATION]': 'explanation',
+    '[OPTIMIZATIONS]': 'optimizations',
+    '[BEST_PRACTICES]': 'best_practices'
+}
+
+class SectionStreamParser:
+    """Splits a streamed LLM response into (section, text) pieces as it arrives.
+    
+    A '[' that might start a section marker is held back until enough text
+    has arrived to tell, so markers split across chunks are still detected.
+    Text before the first marker is dropped.
+    """
+    
+    def __init__(self):
+        self.section = None
+        self._pending = ""
+    
+    def feed(self, text: str) -> List[tuple]:
+        """Consume a chunk and return the (section, text) pieces it completes"""
+        self._pending += text
+        pieces = []
+        
+        while self._pending:
+            bracket = self._pending.find('[')
+            if bracket == -1:
+                self._emit(self._pending, pieces)
+                self._pending = ""
+                break
+            
+            self._emit(self._pending[:bracket], pieces)
+            self._pending = self._pending[bracket:]
+            
+            marker = next((m for m in _SECTION_MARKERS if self._pending.startswith(m)), None)
+            if marker:
+                self.section = _SECTION_MARKERS[marker]
+                self._pending = self._pending[len(marker):]
+            elif any(m.startswith(self._pending) for m in _SECTION_MARKERS):
+                # Could still become a marker; wait for the next chunk
+                break
+            else:
+                self._emit('[', pieces)
+                self._pending = self._pending[1:]
+        
+        return pieces
+    
+    def flush(self) -> List[tuple]:
+        """Return whatever text is still held back at the end of the stream"""
+        pieces = []
+        self._emit(self._pending, pieces)
+        self._pending = ""
+        return pieces
+    
+    def _emit(self, text: str, pieces: List[tuple]):
+        if text and self.section:
+            pieces.append((self.section, text))
+
+class SemanticCache:
+    """Fixed-size LRU cache looked up by cosine similarity of embeddings"""
+    
+    def __init__(self, max_size: int = SEMANTIC_CACHE_SIZE, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.max_size = max_size
+        self.threshold = threshold
+        self._vectors = None  # (max_size, dim) unit vectors, allocated on first put
+        self._values = [None] * max_size
+        self._last_used = np.zeros(max_size, dtype=np.int64)
+        self._size = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def get(self, embedding) -> Optional[Any]:
+        """Value stored for the most similar embedding, if similar enough"""
+        query = self._normalize(embedding)
+        with self._lock:
+            if not self._size:
+                return None
+            similarities = self._vectors[:self._size] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            self._clock += 1
+            self._last_used[best] = self._clock
+            return self._values[best]
+    
+    def put(self, embedding, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+            if self._size < self.max_size:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+            self._vectors[slot] = vector
+            self._values[slot] = value
+            self._clock += 1
+            self._last_used[slot] = self._clock
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._values = [None] * self.max_size
+            self._last_used[:] = 0
+            self._size = 0
+
+class ResponseCache:
+    """Persistent cache of raw LLM responses keyed by a hash of the exact prompt.
+    
+    Entries live in a SQLite file, so they survive restarts and are shared by
+    every worker process on the host, with an in-memory LRU in front for the
+    hottest prompts. Lookups never raise: a broken cache only costs a Groq call.
+    """
+    
+    def __init__(self, db_path: Path, ttl: int = RESPONSE_CACHE_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.memory = QueryCache(max_size=RESPONSE_MEMORY_CACHE_SIZE, ttl=min(ttl, RESPONSE_MEMORY_CACHE_TTL))
+        if self.ttl > 0:
+            try:
+                with self._connect() as conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS llm_responses (
+                            prompt_key TEXT PRIMARY KEY,
+                            content TEXT,
+                            created_at REAL
+                        )
+                    """)
+            except Exception as e:
+                logger.warning(f"⚠️ LLM response cache unavailable: {e}")
+                self.ttl = 0
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    
+    @staticmethod
+    def key(messages) -> str:
+        """Stable key over the model and every message sent to it"""
+        digest = hashlib.blake2b(LLM_MODEL.encode(), digest_size=16)
+        for message in messages:
+            digest.update(b"\x00" + message["role"].encode() + b"\x00" + message["content"].encode())
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for a prompt key, if present and not expired"""
+        if self.ttl <= 0:
+            return None
+        content = self.memory.get(key)
+        if content is not None:
+            return content
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT content FROM llm_responses WHERE prompt_key = ? AND created_at >= ?",
+                    (key, time.time() - self.ttl)
+                ).fetchone()
+            if row is None:
+                return None
+            self.memory.put(key, row[0])
+            return row[0]
+        except Exception as e:
+            logger.warning(f"⚠️ LLM response cache lookup failed: {e}")
+            return None
+    
+    def put(self, key: str, content: str) -> None:
+        if self.ttl <= 0 or not content:
+            return
+        self.memory.put(key, content)
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (prompt_key, content, created_at) VALUES (?, ?, ?)",
+                    (key, content, time.time())
+                )
+        except Exception as e:
+            logger.warning(f"⚠️ LLM response cache write failed: {e}")
+    
+    def clear(self) -> int:
+        """Delete every cached response and return how many there were"""
+        if self.ttl <= 0:
+            return 0
+        self.memory.clear()
+        try:
+            with self._connect() as conn:
+                return conn.execute("DELETE FROM llm_responses").rowcount
+        except Exception as e:
+            logger.warning(f"⚠️ LLM response cache clear failed: {e}")
+            return 0
+
+class BatchingRetriever:
+    """Coalesces concurrent async retrievals into batched FAISS searches.
+    
+    Queries queued within max_wait seconds of each other (up to max_batch)
+    are embedded together and answered by one index.search call.
+    """
+    
+    def __init__(self, generator: 'SchemaGenerator', max_batch: int = 32, max_wait: float = 0.005):
+        self.generator = generator
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = asyncio.Queue()
+        self._worker = None
+    
+    async def retrieve(self, query: str, k: int = 5):
+        """Queue a query and wait for its (documents, query embedding) from the next batch"""
+        key = self.generator._query_cache_key(query, k)
+        cached = self.generator.query_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        
+        future = loop.create_future()
+        self._queue.put_nowait((query, k, future))
+        docs, embedding = await future
+        if docs:
+            self.generator.query_cache.put(key, (docs, embedding))
+        return docs, embedding
+    
+    async def aclose(self):
+        """Cancel the worker task, which otherwise keeps its loop alive"""
+        if self._worker is not None:
+            self._worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+    
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            
+            # Give concurrent requests a moment to join, then take what's queued
+            await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            k = max(item_k for _, item_k, _ in batch)
+            try:
+                results, embeddings = await asyncio.to_thread(self._search, [query for query, _, _ in batch], k)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, item_k, future), docs, embedding in zip(batch, results, embeddings):
+                if not future.done():
+                    future.set_result((docs[:item_k], embedding))
+    
+    def _search(self, queries: List[str], k: int):
+        """Embed a batch of queries together and search the index once"""
+        embeddings = np.asarray(self.generator.embeddings.embed_documents(queries), dtype='float32')
+        return self.generator.retrieve_relevant_docs_batch(queries, k, embeddings), embeddings
+
+class FallbackOrder(list):
+    """Retrieval-order documents returned when reranking failed; never cached"""
+
+
+class BatchingReranker:
+    """Groups concurrent async rerank requests arriving within a short window.
+    
+    Cohere's rerank endpoint scores a single query per call, so requests in a
+    window are deduplicated (identical query, documents and top_n share one
+    call) and the remaining calls are issued together with asyncio.gather.
+    """
+    
+    def __init__(self, generator: 'SchemaGenerator', max_batch: int = 8, max_wait: float = 0.02):
+        self.generator = generator
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = asyncio.Queue()
+        self._worker = None
+    
+    async def rerank(self, query: str, documents: List[Any], top_n: int = 3) -> List[Any]:
+        """Queue a rerank request and wait for its result"""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        
+        future = loop.create_future()
+        self._queue.put_nowait((query, documents, top_n, future))
+        return await future
+    
+    async def aclose(self):
+        """Cancel the worker task, which otherwise keeps its loop alive"""
+        if self._worker is not None:
+            self._worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+    
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            
+            await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            groups = {}
+            for query, documents, top_n, future in batch:
+                key = (query, top_n, tuple(doc.page_content for doc in documents))
+                groups.setdefault(key, (documents, []))[1].append(future)
+            
+            if len(groups) < len(batch):
+                logger.info(f"🔗 Coalesced {len(batch)} rerank requests into {len(groups)} Cohere calls")
+            
+            results = await asyncio.gather(
+                *(self.generator.arerank_documents(query, documents, top_n)
+                  for (query, top_n, _), (documents, _) in groups.items()),
+                return_exceptions=True
+            )
+            
+            for (_, futures), result in zip(groups.values(), results):
+                for future in futures:
+                    if future.done():
+                        continue
+                    if isinstance(result, BaseException):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(type(result)(result))
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+def get_embeddings() -> HuggingFaceEmbeddings:
+    """Process-wide MiniLM embeddings, loaded on first use.
+    
+    Under Gunicorn with preload_app the master loads the model while importing
+    main_api, so forked workers share its weights copy-on-write.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _embeddings = _load_embeddings()
+    return _embeddings
+
+def _load_embeddings() -> HuggingFaceEmbeddings:
+    if EMBEDDINGS_BACKEND == 'onnx':
+        try:
+            # Needs sentence-transformers>=3.2 with onnxruntime/optimum installed
+            # (pip install "sentence-transformers[onnx]", or [onnx-gpu] with
+            # SCHEMA_EMBEDDINGS_DEVICE=cuda)
+            embeddings = HuggingFaceEmbeddings(
+                model_name=EMBEDDINGS_MODEL,
+                model_kwargs={
+                    "device": EMBEDDINGS_DEVICE,
+                    "backend": "onnx",
+                    "model_kwargs": {"file_name": EMBEDDINGS_ONNX_FILE},
+                }
+            )
+            logger.info(f"✅ Loaded ONNX Runtime embeddings ({EMBEDDINGS_ONNX_FILE} on {EMBEDDINGS_DEVICE})")
+            return embeddings
+        except Exception as e:
+            logger.warning(f"⚠️ ONNX embeddings unavailable ({e}), falling back to PyTorch")
+    
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDINGS_MODEL,
+        model_kwargs={"device": EMBEDDINGS_DEVICE}
+    )
+
 class SchemaGenerator:
     """Generates database schemas using FAISS RAG and Groq LLM"""
     
+    # Built once at import; dialect prompts extend it in _SYSTEM_PROMPTS
+    SYSTEM_PROMPT = _BASE_SYSTEM_PROMPT
+    
+    # API clients shared by every generator: the sync pair is created once,
+    # the async pair once per event loop
+    _clients = None
+    _clients_lock = threading.Lock()
+    _async_clients = weakref.WeakKeyDictionary()
+    
     def __init__(self):
+        faiss.omp_set_num_threads(FAISS_THREADS)
+        
         # Initialize API clients
-        self.groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-        self.cohere_client = cohere.Client(os.getenv('COHERE_API_KEY'))
+        self.groq_client, self.cohere_client = self._get_clients()
         
-        # Initialize embeddings
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+        # First rerank model that works; advanced only when Cohere rejects the model
+        self._active_rerank_model = RERANK_MODELS[0]
+        
+        # Retrieval and rerank batchers are created lazily, one per event loop
+        self._batching_retrievers = weakref.WeakKeyDictionary()
+        self._batching_rerankers = weakref.WeakKeyDictionary()
+        
+        # agenerate_schemas calls in flight per loop; the last one to finish
+        # releases the loop's batchers and async clients
+        self._active_batches = weakref.WeakKeyDictionary()
+        
+        # Reranked documents for recent requirements, matched semantically
+        self.rerank_cache = SemanticCache()
+        
+        # Initialize embeddings (shared by every generator in the process)
+        self.embeddings = get_embeddings()
         
         # Set up paths
         self.current_dir = Path(__file__).parent
         self.faiss_index_path = self.current_dir / "schema_faiss_index"
         
+        # Identical prompts (same requirements, context, dialect and schema)
+        # skip the Groq call entirely
+        self.response_cache = ResponseCache(self.current_dir / "llm_response_cache.db")
+        
         # Load vector store
         self.vector_store = None
         self.load_vector_store()
     
     def load_vector_store(self):
         """Load the FAISS vector store"""
+        # Cached retrievals belong to the previous index
+        self.query_cache = QueryCache(max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+        self.rerank_cache = SemanticCache()
+        
         try:
             if self.faiss_index_path.exists():
-                self.vector_store = FAISS.load_local(
-                    str(self.faiss_index_path),
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                logger.info("✅ Schema FAISS vector store loaded successfully")
+                self.log_faiss_build()
+                try:
+                    self.vector_store = self.load_mmap_vector_store()
+                    logger.info("✅ Schema FAISS vector store loaded successfully (mmap)")
+                except Exception as e:
+                    logger.warning(f"⚠️ mmap load failed ({e}), reading index into memory")
+                    self.vector_store = FAISS.load_local(
+                        str(self.faiss_index_path),
+                        self.embeddings,
+                        allow_dangerous_deserialization=True
+                    )
+                    logger.info("✅ Schema FAISS vector store loaded successfully")
+                
+                self.upgrade_flat_index()
+                self.warm_vector_store()
             else:
                 logger.error(f"❌ FAISS index not found at {self.faiss_index_path}")
                 logger.info("💡 Run db_setup.py first to create the vector store")
@@ -60,16 +751,149 @@ class SchemaGenerator:
         except Exception as e:
             logger.error(f"❌ Error loading vector store: {str(e)}")
     
-    def retrieve_relevant_docs(self, query: str, k: int = 5) -> List[Any]:
-        """Retrieve relevant documents from FAISS"""
+    def log_faiss_build(self):
+        """Log which SIMD build of faiss was loaded.
+        
+        Flat-index distances over batched queries go through BLAS sgemm; a
+        source build of faiss should use -DFAISS_ENABLE_MKL=ON (or link
+        OpenBLAS) so that path is fast. Pip wheels already bundle a BLAS.
+        """
+        try:
+            # faiss-cpu wheels ship generic/AVX2/AVX-512 builds and pick one at import
+            compile_options = faiss.get_compile_options()
+            logger.info(f"🧮 FAISS build: {compile_options} ({FAISS_THREADS} OpenMP threads)")
+            if 'AVX2' not in compile_options and 'AVX512' not in compile_options:
+                logger.warning("⚠️ FAISS loaded without AVX2/AVX-512 kernels; vector search will use the generic build")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read FAISS compile options: {e}")
+    
+    def warm_vector_store(self, touches: int = 64):
+        """Pay first-query costs at load time instead of on the first request.
+        
+        A throwaway search loads the embedding model's kernels and walks the
+        index entry points; reconstructing vectors spread across the index
+        faults in pages of the memory-mapped file.
+        """
+        try:
+            warm_start = time.perf_counter_ns()
+            self.vector_store.similarity_search("warmup", k=1)
+            
+            index = self.vector_store.index
+            stride = max(1, index.ntotal // touches)
+            for i in range(0, index.ntotal, stride):
+                index.reconstruct(i)
+            logger.info(f"🔥 Warmed vector store in {(time.perf_counter_ns() - warm_start) / 1e9:.3f}s")
+        except Exception as e:
+            # IVF indexes without a direct map can't reconstruct; the search alone still helps
+            logger.warning(f"⚠️ Vector store warm-up incomplete: {e}")
+    
+    def upgrade_flat_index(self):
+        """Swap a large flat index for an HNSW graph over 8-bit quantized copies of its vectors"""
+        index = self.vector_store.index
+        if not isinstance(index, faiss.IndexFlat) or index.ntotal < HNSW_MIN_VECTORS:
+            return
+        
+        try:
+            upgrade_start = time.perf_counter_ns()
+            # Same metric as the flat index, so scores keep their meaning, and
+            # vectors keep their ids, so the docstore mapping stays valid
+            # SQ8 stores one byte per dimension (4x smaller than float32) and
+            # only needs the per-dimension value ranges as training
+            vectors = index.reconstruct_n(0, index.ntotal)
+            hnsw_index = faiss.IndexHNSWSQ(index.d, faiss.ScalarQuantizer.QT_8bit, HNSW_M, index.metric_type)
+            hnsw_index.train(vectors)
+            hnsw_index.add(vectors)
+            hnsw_index.hnsw.efSearch = HNSW_EF_SEARCH
+            self.vector_store.index = hnsw_index
+            logger.info(f"✅ Rebuilt flat index as HNSW{HNSW_M},SQ8 ({index.ntotal} vectors) in {(time.perf_counter_ns() - upgrade_start) / 1e9:.1f}s")
+        except Exception as e:
+            logger.warning(f"⚠️ HNSW rebuild failed, keeping flat index: {e}")
+            return
+        
+        self.persist_index(hnsw_index)
+    
+    def persist_index(self, index):
+        """Save an upgraded index as UPGRADED_INDEX_FILE so later loads skip the rebuild.
+        
+        The file is written under a temporary name and renamed into place, so
+        a concurrent reader never sees a partial file. index.faiss keeps the
+        original vectors, and vector ids are unchanged, so index.pkl serves both.
+        """
+        index_file = self.faiss_index_path / UPGRADED_INDEX_FILE
+        tmp_file = index_file.with_name(f"{UPGRADED_INDEX_FILE}.{os.getpid()}.tmp")
+        try:
+            faiss.write_index(index, str(tmp_file))
+            os.replace(tmp_file, index_file)
+            logger.info(f"💾 Saved upgraded index to {index_file}")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save upgraded index, it will be rebuilt on next load: {e}")
+            tmp_file.unlink(missing_ok=True)
+    
+    def _index_file(self) -> Path:
+        """The upgraded index if one was saved from the current index.faiss, else index.faiss"""
+        index_file = self.faiss_index_path / "index.faiss"
+        upgraded_file = self.faiss_index_path / UPGRADED_INDEX_FILE
+        try:
+            # Re-running db_setup.py rewrites index.faiss, which retires an older upgrade
+            if upgraded_file.stat().st_mtime >= index_file.stat().st_mtime:
+                return upgraded_file
+        except FileNotFoundError:
+            pass
+        return index_file
+    
+    def load_mmap_vector_store(self) -> FAISS:
+        """Load the FAISS index memory-mapped and read-only.
+        
+        The index pages are then backed by the page cache, so Gunicorn workers
+        forked from a preloaded master share one copy instead of each holding
+        their own. The docstore pickle is read the same way FAISS.load_local does.
+        """
+        io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        # IO_FLAG_MMAP only covers IVF lists; newer faiss builds can also map
+        # flat/HNSW code arrays in place instead of copying them into RAM
+        io_flags |= getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)
+        index = faiss.read_index(str(self._index_file()), io_flags)
+        
+        with open(self.faiss_index_path / "index.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        
+        return FAISS(self.embeddings, index, docstore, index_to_docstore_id)
+    
+    @staticmethod
+    def _query_cache_key(query: str, k: int) -> bytes:
+        return hashlib.blake2b(f"{query}|{k}".encode(), digest_size=16).digest()
+    
+    def retrieve_for_query(self, query: str, k: int = 5):
+        """Embed a query and retrieve its documents, memoised per (query, k).
+        
+        Returns (documents, query embedding); repeated queries skip both the
+        embedding forward pass and the FAISS search.
+        """
+        key = self._query_cache_key(query, k)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            logger.info("⚡ Query cache hit, reusing retrieved documents")
+            return cached
+        
+        embedding = self.embeddings.embed_query(query)
+        docs = self.retrieve_relevant_docs(query, k=k, embedding=embedding)
+        if docs:
+            self.query_cache.put(key, (docs, embedding))
+        return docs, embedding
+    
+    def retrieve_relevant_docs(self, query: str, k: int = 5, embedding: Optional[List[float]] = None) -> List[Any]:
+        """Retrieve relevant documents from FAISS, reusing the query embedding if given"""
         if not self.vector_store:
             return []
         
         try:
             # Track retrieval performance
-            retrieval_start = time.time()
-            docs_with_scores = self.vector_store.similarity_search_with_score(query, k=k)
-            retrieval_time = time.time() - retrieval_start
+            retrieval_start = time.perf_counter_ns()
+            if embedding is not None:
+                docs_with_scores = self.vector_store.similarity_search_with_score_by_vector(embedding, k=k)
+            else:
+                docs_with_scores = self.vector_store.similarity_search_with_score(query, k=k)
+            retrieval_time = (time.perf_counter_ns() - retrieval_start) / 1e9
             
             # Extract documents and scores
             docs = [doc for doc, score in docs_with_scores]
@@ -91,424 +915,712 @@ class SchemaGenerator:
             logger.error(f"Error retrieving documents: {str(e)}")
             return []
     
+    def retrieve_relevant_docs_batch(self, queries: List[str], k: int = 5,
+                                     query_embeddings: Optional[np.ndarray] = None) -> List[List[Any]]:
+        """Retrieve documents for several queries with a single FAISS search"""
+        if not self.vector_store or not queries:
+            return [[] for _ in queries]
+        
+        try:
+            store = self.vector_store
+            retrieval_start = time.perf_counter_ns()
+            if query_embeddings is None:
+                query_embeddings = self.embeddings.embed_documents(queries)
+            xq = np.asarray(query_embeddings, dtype='float32')
+            distances, ids = store.index.search(xq, k)
+            retrieval_time = (time.perf_counter_ns() - retrieval_start) / 1e9
+            
+            results = []
+            for row_scores, row_ids in zip(distances, ids):
+                docs = []
+                for score, idx in zip(row_scores, row_ids):
+                    if idx == -1:
+                        continue
+                    # Copy so the same chunk can carry different scores per query
+                    doc = copy.copy(store.docstore.search(store.index_to_docstore_id[idx]))
+                    doc.metadata = {
+                        **doc.metadata,
+                        'retrieval_score': float(score),
+                        'retrieval_time': retrieval_time
+                    }
+                    docs.append(doc)
+                results.append(docs)
+            
+            logger.info(f"📊 Batched retrieval: {len(queries)} queries in {retrieval_time:.3f}s")
+            return results
+        except Exception as e:
+            logger.error(f"Error retrieving documents: {str(e)}")
+            return [[] for _ in queries]
+    
+    def _apply_rerank(self, documents: List[Any], reranked: Any, model: str,
+                      rerank_time: float, top_n: int) -> List[Any]:
+        """Log reranking impact and map Cohere results back to documents"""
+        # Store original retrieval scores
+        original_scores = [doc.metadata.get('retrieval_score', 0) for doc in documents]
+        
+        # Extract rerank scores
+        rerank_scores = [result.relevance_score for result in reranked.results]
+        
+        # Log reranking impact
+        logger.info(f"📊 RAG Reranking Metrics:")
+        logger.info(f"  - Model: {model}")
+        logger.info(f"  - Rerank time: {rerank_time:.3f}s")
+        logger.info(f"  - Before (retrieval): {[f'{s:.3f}' for s in original_scores[:top_n]]}")
+        logger.info(f"  - After (rerank): {[f'{s:.3f}' for s in rerank_scores]}")
+        logger.info(f"  - Avg improvement: {(sum(rerank_scores)/len(rerank_scores) - sum(original_scores[:top_n])/len(original_scores[:top_n])):.3f}")
+        
+        # Return reranked documents
+        reranked_docs = [documents[result.index] for result in reranked.results]
+        
+        logger.info(f"✅ Reranked documents using {model}")
+        return reranked_docs
+    
+    def _next_rerank_model(self, failed_model: str, error: Exception) -> Optional[str]:
+        """Pin the next fallback rerank model if failed_model is unavailable.
+        
+        Returns None (use retrieval order) for errors that another model
+        would not fix, such as timeouts or server errors.
+        """
+        status = getattr(error, 'status_code', None) or getattr(error, 'http_status', None)
+        if status not in (400, 404):
+            return None
+        
+        next_index = RERANK_MODELS.index(failed_model) + 1
+        if next_index >= len(RERANK_MODELS):
+            return None
+        
+        self._active_rerank_model = RERANK_MODELS[next_index]
+        logger.warning(f"⚠️ Rerank model {failed_model} unavailable, switching to {self._active_rerank_model}")
+        return self._active_rerank_model
+    
     def rerank_documents(self, query: str, documents: List[Any], top_n: int = 3) -> List[Any]:
         """Rerank documents using Cohere for better relevance"""
         if not documents:
             return []
+        if len(documents) <= top_n:
+            # Every document is kept either way, already in similarity order
+            return list(documents)
         
         try:
-            # Store original retrieval scores
-            original_scores = [doc.metadata.get('retrieval_score', 0) for doc in documents]
-            
-            # Try different reranking models with fallback
-            rerank_models = [
-                "rerank-english-v3.0",
-                "rerank-english-v2.0", 
-                "rerank-multilingual-v3.0"
-            ]
+            docs_text = [doc.page_content for doc in documents]
             
-            for model in rerank_models:
+            # Use the pinned model; only a model-unavailable error moves on to the next one
+            model = self._active_rerank_model
+            while model:
                 try:
-                    rerank_start = time.time()
+                    rerank_start = time.perf_counter_ns()
                     reranked = self.cohere_client.rerank(
                         model=model,
                         query=query,
-                        documents=[doc.page_content for doc in documents],
-                        top_n=top_n
+                        documents=docs_text,
+                        top_n=top_n,
+                        request_options={"timeout_in_seconds": RERANK_TIMEOUT}
                     )
-                    rerank_time = time.time() - rerank_start
-                    
-                    # Extract rerank scores
-                    rerank_scores = [result.relevance_score for result in reranked.results]
-                    
-                    # Log reranking impact
-                    logger.info(f"📊 RAG Reranking Metrics:")
-                    logger.info(f"  - Model: {model}")
-                    logger.info(f"  - Rerank time: {rerank_time:.3f}s")
-                    logger.info(f"  - Before (retrieval): {[f'{s:.3f}' for s in original_scores[:top_n]]}")
-                    logger.info(f"  - After (rerank): {[f'{s:.3f}' for s in rerank_scores]}")
-                    logger.info(f"  - Avg improvement: {(sum(rerank_scores)/len(rerank_scores) - sum(original_scores[:top_n])/len(original_scores[:top_n])):.3f}")
-                    
-                    # Return reranked documents
-                    reranked_docs = []
-                    for result in reranked.results:
-                        reranked_docs.append(documents[result.index])
-                    
-                    logger.info(f"✅ Reranked documents using {model}")
-                    return reranked_docs
+                    return self._apply_rerank(documents, reranked, model, (time.perf_counter_ns() - rerank_start) / 1e9, top_n)
                     
                 except Exception as e:
                     logger.warning(f"Reranking failed with {model}: {str(e)}")
-                    continue
+                    model = self._next_rerank_model(model, e)
             
             # Fallback to original documents
             logger.info("Using original document order as fallback")
-            return documents[:top_n]
+            return FallbackOrder(documents[:top_n])
             
         except Exception as e:
             logger.error(f"Error in reranking: {str(e)}")
-            return documents[:top_n]
+            return FallbackOrder(documents[:top_n])
     
-    def generate_schema(self, requirements: str, dialect: str = "postgresql", conversation_context=None, existing_schema=None, project_id: Optional[str] = None) -> Dict[str, Any]:
-        """Generate database schema based on requirements for specific dialect"""
-        start_time = time.time()
+    def _cached_rerank(self, requirements: str, docs: List[Any], query_embedding) -> List[Any]:
+        """Rerank docs, reusing the result of a semantically similar earlier request"""
+        reranked_docs = self.rerank_cache.get(query_embedding)
+        if reranked_docs is not None:
+            logger.info("♻️ Reusing reranked documents from a similar request")
+            return reranked_docs
+        
+        reranked_docs = self.rerank_documents(requirements, docs, top_n=3)
+        # A failed rerank shouldn't be served to later similar requests
+        if not isinstance(reranked_docs, FallbackOrder):
+            self.rerank_cache.put(query_embedding, reranked_docs)
+        return reranked_docs
+    
+    async def arerank_documents(self, query: str, documents: List[Any], top_n: int = 3) -> List[Any]:
+        """Async rerank_documents using the event loop's Cohere client"""
+        if not documents:
+            return []
+        if len(documents) <= top_n:
+            # Every document is kept either way, already in similarity order
+            return list(documents)
+        
+        try:
+            _, cohere_client = self._get_async_clients()
+            docs_text = [doc.page_content for doc in documents]
+            
+            model = self._active_rerank_model
+            while model:
+                try:
+                    rerank_start = time.perf_counter_ns()
+                    reranked = await cohere_client.rerank(
+                        model=model,
+                        query=query,
+                        documents=docs_text,
+                        top_n=top_n,
+                        request_options={"timeout_in_seconds": RERANK_TIMEOUT}
+                    )
+                    return self._apply_rerank(documents, reranked, model, (time.perf_counter_ns() - rerank_start) / 1e9, top_n)
+                    
+                except Exception as e:
+                    logger.warning(f"Reranking failed with {model}: {str(e)}")
+                    model = self._next_rerank_model(model, e)
+            
+            logger.info("Using original document order as fallback")
+            return FallbackOrder(documents[:top_n])
+            
+        except Exception as e:
+            logger.error(f"Error in reranking: {str(e)}")
+            return FallbackOrder(documents[:top_n])
+    
+    @classmethod
+    def _get_clients(cls):
+        """Sync Groq and Cohere clients over one keep-alive connection pool.
+        
+        Built on first use and reused by every SchemaGenerator, so a new
+        generator doesn't pay for fresh connections and TLS handshakes.
+        """
+        if cls._clients is None:
+            with cls._clients_lock:
+                if cls._clients is None:
+                    http_client = httpx.Client(http2=HTTP2, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+                    cls._clients = (
+                        Groq(api_key=os.getenv('GROQ_API_KEY'), http_client=http_client),
+                        cohere.Client(os.getenv('COHERE_API_KEY'), httpx_client=http_client)
+                    )
+        return cls._clients
+    
+    def _get_async_clients(self):
+        """Async Groq and Cohere clients for the running event loop.
+        
+        Their shared HTTP connection pool belongs to the loop it is first used
+        on, so one pair is kept per loop until _aclose_loop_resources closes it.
+        """
+        loop = asyncio.get_running_loop()
+        clients = self._async_clients.get(loop)
+        if clients is None:
+            http_client = httpx.AsyncClient(http2=HTTP2, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+            clients = (
+                AsyncGroq(api_key=os.getenv('GROQ_API_KEY'), http_client=http_client),
+                cohere.AsyncClient(os.getenv('COHERE_API_KEY'), httpx_client=http_client),
+                http_client
+            )
+            self._async_clients[loop] = clients
+        return clients[:2]
+    
+    async def _aclose_loop_resources(self):
+        """Stop the running loop's batchers and close its async clients.
         
-        logger.info(f"\n{'='*80}")
-        logger.info(f"SCHEMA GENERATOR - EXISTING SCHEMA CONTEXT CHECK")
-        logger.info(f"{'='*80}")
+        The batchers' worker tasks and the clients' connection pool hold the
+        loop alive, so the per-loop entries are never evicted on their own
+        and must be dropped here.
+        """
+        loop = asyncio.get_running_loop()
+        for batchers in (self._batching_retrievers, self._batching_rerankers):
+            batcher = batchers.pop(loop, None)
+            if batcher is not None:
+                await batcher.aclose()
+        
+        clients = self._async_clients.pop(loop, None)
+        if clients is not None:
+            await clients[2].aclose()
+    
+    def _get_batching_retriever(self) -> BatchingRetriever:
+        """BatchingRetriever for the running event loop"""
+        loop = asyncio.get_running_loop()
+        retriever = self._batching_retrievers.get(loop)
+        if retriever is None:
+            retriever = BatchingRetriever(self)
+            self._batching_retrievers[loop] = retriever
+        return retriever
+    
+    def _get_batching_reranker(self) -> BatchingReranker:
+        """BatchingReranker for the running event loop"""
+        loop = asyncio.get_running_loop()
+        reranker = self._batching_rerankers.get(loop)
+        if reranker is None:
+            reranker = BatchingReranker(self)
+            self._batching_rerankers[loop] = reranker
+        return reranker
+    
+    def _error_result(self, error: str) -> Dict[str, Any]:
+        """Result returned when a schema could not be generated"""
+        return {
+            "success": False,
+            "error": error,
+            "schema": None,
+            "explanation": None
+        }
+    
+    def _log_existing_schema(self, existing_schema) -> None:
+        """Log which existing schema (if any) the request carries"""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        logger.debug("\n%s\nSCHEMA GENERATOR - EXISTING SCHEMA CONTEXT CHECK\n%s", _BANNER, _BANNER)
         if existing_schema:
             tables = existing_schema.get('tables', [])
-            logger.info(f"✅ Existing schema received: {len(tables)} tables")
-            logger.info(f"   Tables: {[t.get('name') for t in tables[:10]]}")
+            logger.debug("✅ Existing schema received: %d tables", len(tables))
+            logger.debug("   Tables: %s", [t.get('name') for t in tables[:10]])
         else:
-            logger.info(f"❌ No existing schema provided (existing_schema={existing_schema})")
-        logger.info(f"{'='*80}\n")
+            logger.debug("❌ No existing schema provided (existing_schema=%s)", existing_schema)
+        logger.debug("%s\n", _BANNER)
+    
+    def _resolve_dialect(self, dialect: str):
+        """Normalize the requested dialect, returning (dialect, error_result)"""
+        dialect = dialect.lower()
+        
+        # Map "analytics" dialect to "trino" (frontend abstraction)
+        if dialect == 'analytics':
+            dialect = 'trino'
+            logger.info("📊 Analytics dialect detected, mapping to Trino")
+        
+        # Validate dialect
+        if dialect not in _SUPPORTED_DIALECTS:
+            return dialect, self._error_result(f"Unsupported dialect: {dialect}. Supported: {list(_DIALECT_FEATURES)}")
+        
+        return dialect, None
+    
+    def _max_tokens(self, requirements: str, conversation_context=None, existing_schema=None) -> int:
+        """Completion budget for a request, from its estimated table count and context"""
+        separators = len(_ENTITY_SEPARATOR_RE.findall(requirements))
+        is_extension = existing_schema and existing_schema.get('tables')
+        if not separators and not is_extension:
+            # A one-line greenfield brief ("Design an e-commerce database")
+            # says nothing about its size and often needs the most tables
+            return MAX_TOKENS_CAP
+        budget = 600 + 150 * (separators + 1)
+        if is_extension:
+            budget += 200
+        if conversation_context:
+            budget += 150 * len(conversation_context.get('queries', [])[-3:])
+        return max(MAX_TOKENS_FLOOR, min(MAX_TOKENS_CAP, budget))
+    
+    def _build_messages(self, requirements: str, reranked_docs: List[Any], dialect: str,
+                        conversation_context=None, existing_schema=None) -> Tuple[Dict[str, str], ...]:
+        """Build the Groq chat messages for a generation request"""
+        # Prepare context; extension prompts only use its first few hundred chars
+        is_extension = existing_schema and existing_schema.get('tables')
+        context = self._join_context(reranked_docs, _EXTENSION_CONTEXT_CHARS if is_extension else None)
+        
+        # Create dialect-specific prompt with conversation context AND existing schema
+        prompt = self.create_schema_prompt(requirements, context, dialect, conversation_context, existing_schema)
+        
+        # Log prompt preview to verify existing schema is included
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("\n%s\nFINAL PROMPT PREVIEW (first 1000 chars)\n%s\n%s", _BANNER, _BANNER, prompt[:1000])
+            if "EXISTING DATABASE SCHEMA" in prompt:
+                logger.debug("\n✅ EXISTING SCHEMA FOUND IN PROMPT")
+            else:
+                logger.debug("\n❌ EXISTING SCHEMA NOT FOUND IN PROMPT")
+            logger.debug("%s\n", _BANNER)
+        
+        # Dialect-specific system prompt first, then the request
+        return (
+            {
+                "role": "system",
+                "content": self.get_schema_prompt_template(dialect)
+            },
+            {
+                "role": "user", 
+                "content": prompt
+            },
+        )
+    
+    @staticmethod
+    def _join_context(docs: List[Any], limit: Optional[int] = None) -> str:
+        """Same as joining the page contents and slicing to limit, without building the rest"""
+        if limit is None:
+            return "\n\n".join(doc.page_content for doc in docs)
+        parts = []
+        length = -2  # no separator before the first document
+        for doc in docs:
+            if length >= limit:
+                break
+            piece = doc.page_content[:limit]
+            parts.append(piece)
+            length += len(piece) + 2
+        return "\n\n".join(parts)[:limit]
+    
+    def _cache_response(self, key: str, content: Optional[str], finish_reason: Optional[str]):
+        """Store a completed LLM response; truncated ones are regenerated next time"""
+        if finish_reason == "length":
+            logger.warning("⚠️ LLM response hit max_tokens; not caching it")
+            return
+        self.response_cache.put(key, content)
+    
+    def _finish_generation(self, requirements: str, content: str, dialect: str, docs: List[Any],
+                           reranked_docs: List[Any], start_time: int, project_id: Optional[str]) -> Dict[str, Any]:
+        """Parse the LLM response, log analytics and build the success result"""
+        # Parse response with structured format
+        schema, explanation, optimizations, best_practices = self.parse_schema_response(content)
+        
+        response_time = (time.perf_counter_ns() - start_time) / 1e9
+        
+        # Log analytics with dialect information, without waiting for the write
+        schema_analytics.log_schema_generation_async(
+            requirements=requirements,
+            schema_content=schema,
+            explanation=explanation,
+            optimizations=optimizations,
+            response_time=response_time,
+            docs_retrieved=len(docs),
+            docs_used=len(reranked_docs),
+            success=True,
+            user_id=project_id,  # Track which project this belongs to
+            reranking_model=self._active_rerank_model,
+            llm_model=LLM_MODEL,
+            dialect=dialect  # Add dialect to analytics
+        )
+        
+        return {
+            "success": True,
+            "schema": schema,
+            "explanation": explanation,
+            "optimizations": optimizations,
+            "best_practices": best_practices,
+            "dialect": dialect,
+            "dialect_features": self.get_dialect_features(dialect),
+            "response_time": response_time,
+            "docs_retrieved": len(docs),
+            "docs_used": len(reranked_docs),
+            "generated_content": content  # Full LLM response for debugging
+        }
+    
+    def _failed_generation(self, requirements: str, error: Exception, docs: List[Any], start_time: int) -> Dict[str, Any]:
+        """Log a failed generation and build the error result"""
+        logger.error(f"Error generating schema: {str(error)}")
+        
+        # Log failed generation
+        schema_analytics.log_schema_generation_async(
+            requirements=requirements,
+            schema_content="",
+            explanation="",
+            optimizations="",
+            response_time=(time.perf_counter_ns() - start_time) / 1e9,
+            docs_retrieved=len(docs),
+            docs_used=0,
+            success=False,
+            error_message=str(error)
+        )
+        
+        return self._error_result(str(error))
+    
+    def generate_schema(self, requirements: str, dialect: str = "postgresql", conversation_context=None, existing_schema=None, project_id: Optional[str] = None) -> Dict[str, Any]:
+        """Generate database schema based on requirements for specific dialect"""
+        start_time = time.perf_counter_ns()
+        self._log_existing_schema(existing_schema)
+        docs = []
         
         try:
-            # Map "analytics" dialect to "trino" (frontend abstraction)
-            if dialect.lower() == 'analytics':
-                dialect = 'trino'
-                logger.info("📊 Analytics dialect detected, mapping to Trino")
-            
-            # Validate dialect
-            supported_dialects = ['mysql', 'postgresql', 'trino', 'spark']
-            if dialect.lower() not in supported_dialects:
-                return {
-                    "success": False,
-                    "error": f"Unsupported dialect: {dialect}. Supported: {supported_dialects}",
-                    "schema": None,
-                    "explanation": None
-                }
-            
-            dialect = dialect.lower()
+            dialect, error = self._resolve_dialect(dialect)
+            if error:
+                return error
             
-            # Retrieve relevant documents
-            docs = self.retrieve_relevant_docs(requirements, k=5)
+            # Retrieve relevant documents, embedding the requirements once for
+            # both the FAISS search and the rerank cache lookup
+            docs, query_embedding = self.retrieve_for_query(requirements, k=5)
             
             if not docs:
-                return {
-                    "success": False,
-                    "error": "No relevant documentation found. Please run db_setup.py first.",
-                    "schema": None,
-                    "explanation": None
-                }
+                return self._error_result("No relevant documentation found. Please run db_setup.py first.")
             
             # Rerank documents
-            reranked_docs = self.rerank_documents(requirements, docs, top_n=3)
-            
-            # Prepare context
-            context = "\n\n".join([doc.page_content for doc in reranked_docs])
+            reranked_docs = self._cached_rerank(requirements, docs, query_embedding)
             
-            # Create dialect-specific prompt with conversation context AND existing schema
-            prompt = self.create_schema_prompt(requirements, context, dialect, conversation_context, existing_schema)
+            messages = self._build_messages(requirements, reranked_docs, dialect, conversation_context, existing_schema)
             
-            # Log prompt preview to verify existing schema is included
-            logger.info(f"\n{'='*80}")
-            logger.info(f"FINAL PROMPT PREVIEW (first 1000 chars)")
-            logger.info(f"{'='*80}")
-            logger.info(prompt[:1000])
-            if "EXISTING DATABASE SCHEMA" in prompt:
-                logger.info(f"\n✅ EXISTING SCHEMA FOUND IN PROMPT")
+            response_key = self.response_cache.key(messages)
+            content = self.response_cache.get(response_key)
+            if content is not None:
+                logger.info("♻️ Reusing cached LLM response for an identical prompt")
             else:
-                logger.info(f"\n❌ EXISTING SCHEMA NOT FOUND IN PROMPT")
-            logger.info(f"{'='*80}\n")
-            
-            # Get dialect-specific system prompt
-            system_prompt = self.get_schema_prompt_template(dialect)
-            
-            # Generate schema using Groq with dialect-specific prompts
-            response = self.groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=2000
-            )
+                # Generate schema using Groq with dialect-specific prompts
+                max_tokens = self._max_tokens(requirements, conversation_context, existing_schema)
+                response = self.groq_client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=max_tokens
+                )
+                if response.choices[0].finish_reason == "length" and max_tokens < MAX_TOKENS_CAP:
+                    logger.warning(f"⚠️ Response truncated at {max_tokens} tokens, retrying with {MAX_TOKENS_CAP}")
+                    response = self.groq_client.chat.completions.create(
+                        model=LLM_MODEL,
+                        messages=messages,
+                        temperature=0.3,
+                        max_tokens=MAX_TOKENS_CAP
+                    )
+                
+                content = response.choices[0].message.content
+                self._cache_response(response_key, content, response.choices[0].finish_reason)
+            return self._finish_generation(requirements, content, dialect, docs, reranked_docs, start_time, project_id)
+            
+        except Exception as e:
+            return self._failed_generation(requirements, e, docs, start_time)
+    
+    async def agenerate_schema(self, requirements: str, dialect: str = "postgresql", conversation_context=None, existing_schema=None, project_id: Optional[str] = None) -> Dict[str, Any]:
+        """Async generate_schema: awaits Cohere and Groq, batches FAISS retrieval, runs blocking work in threads"""
+        start_time = time.perf_counter_ns()
+        self._log_existing_schema(existing_schema)
+        docs = []
+        
+        try:
+            dialect, error = self._resolve_dialect(dialect)
+            if error:
+                return error
             
-            # Parse response with structured format
-            content = response.choices[0].message.content
-            schema, explanation, optimizations, best_practices = self.parse_schema_response(content)
+            # Concurrent requests share one batched FAISS search
+            docs, query_embedding = await self._get_batching_retriever().retrieve(requirements, k=5)
             
-            end_time = time.time()
-            response_time = end_time - start_time
+            if not docs:
+                return self._error_result("No relevant documentation found. Please run db_setup.py first.")
             
-            # Log analytics with dialect information
-            try:
-                schema_id = schema_analytics.log_schema_generation(
-                    requirements=requirements,
-                    schema_content=schema,
-                    explanation=explanation,
-                    optimizations=optimizations,
-                    response_time=response_time,
-                    docs_retrieved=len(docs),
-                    docs_used=len(reranked_docs),
-                    success=True,
-                    user_id=project_id,  # Track which project this belongs to
-                    reranking_model="rerank-english-v3.0",
-                    llm_model="llama-3.3-70b-versatile",
-                    dialect=dialect  # Add dialect to analytics
-                )
-                logger.info(f"Analytics logged for schema ID: {schema_id}")
-            except Exception as analytics_error:
-                logger.warning(f"Failed to log analytics: {analytics_error}")
-            
-            return {
-                "success": True,
-                "schema": schema,
-                "explanation": explanation,
-                "optimizations": optimizations,
-                "best_practices": best_practices,
-                "dialect": dialect,
-                "dialect_features": self.get_dialect_features(dialect),
-                "response_time": response_time,
-                "docs_retrieved": len(docs),
-                "docs_used": len(reranked_docs),
-                "generated_content": content  # Full LLM response for debugging
-            }
+            reranked_docs = self.rerank_cache.get(query_embedding)
+            if reranked_docs is None:
+                reranked_docs = await self._get_batching_reranker().rerank(requirements, docs, top_n=3)
+                if not isinstance(reranked_docs, FallbackOrder):
+                    self.rerank_cache.put(query_embedding, reranked_docs)
+            else:
+                logger.info("♻️ Reusing reranked documents from a similar request")
             
-        except Exception as e:
-            logger.error(f"Error generating schema: {str(e)}")
+            messages = self._build_messages(requirements, reranked_docs, dialect, conversation_context, existing_schema)
             
-            # Log failed generation
-            try:
-                schema_analytics.log_schema_generation(
-                    requirements=requirements,
-                    schema_content="",
-                    explanation="",
-                    optimizations="",
-                    response_time=time.time() - start_time,
-                    docs_retrieved=len(docs) if 'docs' in locals() else 0,
-                    docs_used=0,
-                    success=False,
-                    error_message=str(e)
+            response_key = self.response_cache.key(messages)
+            content = await asyncio.to_thread(self.response_cache.get, response_key)
+            if content is not None:
+                logger.info("♻️ Reusing cached LLM response for an identical prompt")
+            else:
+                groq_client, _ = self._get_async_clients()
+                max_tokens = self._max_tokens(requirements, conversation_context, existing_schema)
+                response = await groq_client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=max_tokens
                 )
-            except Exception as analytics_error:
-                logger.warning(f"Failed to log error analytics: {analytics_error}")
+                if response.choices[0].finish_reason == "length" and max_tokens < MAX_TOKENS_CAP:
+                    logger.warning(f"⚠️ Response truncated at {max_tokens} tokens, retrying with {MAX_TOKENS_CAP}")
+                    response = await groq_client.chat.completions.create(
+                        model=LLM_MODEL,
+                        messages=messages,
+                        temperature=0.3,
+                        max_tokens=MAX_TOKENS_CAP
+                    )
+                
+                content = response.choices[0].message.content
+                await asyncio.to_thread(self._cache_response, response_key, content, response.choices[0].finish_reason)
+            return await asyncio.to_thread(
+                self._finish_generation, requirements, content, dialect, docs, reranked_docs, start_time, project_id
+            )
             
-            return {
-                "success": False,
-                "error": str(e),
-                "schema": None,
-                "explanation": None
-            }
+        except Exception as e:
+            return await asyncio.to_thread(self._failed_generation, requirements, e, docs, start_time)
     
-    def get_schema_prompt_template(self, dialect: str) -> str:
-        """Get dialect-specific system prompt for schema generation"""
-        base_prompt = """You are an expert database architect specializing in schema design and optimization.
+    async def agenerate_schemas(self, requests: List[Dict[str, Any]],
+                                max_concurrency: int = ASYNC_MAX_CONCURRENCY) -> List[Dict[str, Any]]:
+        """Generate schemas for several requests concurrently.
         
-Your responses should be:
-1. Technically accurate and follow database best practices
-2. Include proper data types, constraints, and indexing strategies
-3. Consider performance, scalability, and maintainability
-4. Provide clear explanations for design decisions
-
-Format your response as:
-[SCHEMA]
-<DDL statements - PLAIN TEXT ONLY, NO MARKDOWN CODE FENCES, NO ```sql or ``` markers>
-[EXPLANATION]
-<Design rationale and best practices>
-[OPTIMIZATIONS]
-<Performance recommendations>
-[BEST_PRACTICES]
-<Categorized best practices with title, description, category>
-
-**CRITICAL: In the [SCHEMA] section, write ONLY pure SQL DDL statements. Do NOT wrap them in markdown code blocks (```sql). Write raw SQL only.**
-"""
+        Each request is a dict of agenerate_schema keyword arguments. At most
+        max_concurrency generations are in flight, to stay within provider
+        rate limits. Results are returned in request order.
+        """
+        loop = asyncio.get_running_loop()
+        self._active_batches[loop] = self._active_batches.get(loop, 0) + 1
         
-        dialect_specifics = {
-            'mysql': """
-MYSQL SPECIFIC REQUIREMENTS:
-- Use AUTO_INCREMENT for primary keys, never SERIAL
-- Specify ENGINE=InnoDB for ACID compliance
-- Use appropriate MySQL data types (INT, VARCHAR, TEXT, DATETIME)
-- Add DEFAULT CHARSET=utf8mb4 for full Unicode support
-- Use UNIQUE KEY and INDEX syntax specific to MySQL
-- Consider partitioning for large tables
-- Include proper foreign key constraints with ON DELETE/UPDATE actions
-- Use TIMESTAMP DEFAULT CURRENT_TIMESTAMP for audit fields""",
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run(kwargs):
+            async with semaphore:
+                return await self.agenerate_schema(**kwargs)
+        
+        try:
+            # Retrieve for the whole batch up front so every generation's
+            # retrieval is a query cache hit, however the semaphore staggers them
+            await asyncio.to_thread(self.prefetch_retrievals, [kwargs['requirements'] for kwargs in requests])
             
-            'postgresql': """
-POSTGRESQL SPECIFIC REQUIREMENTS:
-- Use SERIAL or IDENTITY columns for auto-incrementing primary keys
-- Leverage JSONB for flexible JSON storage with indexing
-- Use appropriate PostgreSQL data types (BIGSERIAL, TIMESTAMPTZ, ARRAY)
-- Include proper constraints (CHECK, UNIQUE, FOREIGN KEY)
-- Use GENERATED ALWAYS AS for computed columns where applicable
-- Use CREATE INDEX CONCURRENTLY for production environments
-- Implement proper schema organization with namespaces
-
-POSTGRESQL PARTITIONING RULES (CRITICAL):
-- Partition key expressions MUST use IMMUTABLE functions only
-- WRONG: PARTITION BY RANGE (EXTRACT(YEAR FROM created_at)) - will fail!
-- CORRECT: PARTITION BY RANGE (created_at) - partition directly on timestamp column
-- CORRECT: Add generated column first: year INTEGER GENERATED ALWAYS AS (EXTRACT(YEAR FROM created_at)::INTEGER) STORED, then PARTITION BY RANGE (year)
-- When partitioning by date/time, use the timestamp column directly, not functions
-- Create child partitions separately after the main table with FOR VALUES FROM/TO""",
+            return await asyncio.gather(*(run(kwargs) for kwargs in requests))
+        finally:
+            self._active_batches[loop] -= 1
+            if not self._active_batches[loop]:
+                del self._active_batches[loop]
+                await self._aclose_loop_resources()
+    
+    def generate_schemas(self, requests: List[Dict[str, Any]],
+                         max_concurrency: int = ASYNC_MAX_CONCURRENCY) -> List[Dict[str, Any]]:
+        """Synchronous agenerate_schemas, for callers without a running event loop.
+        
+        Each call runs on a fresh loop; its batchers and async clients are
+        released before the loop closes.
+        """
+        return asyncio.run(self.agenerate_schemas(requests, max_concurrency))
+    
+    def prefetch_retrievals(self, queries: List[str], k: int = 5):
+        """Embed uncached queries in one forward pass, search them with one
+        FAISS call and store the results in the query cache"""
+        pending = list(dict.fromkeys(
+            query for query in queries if self.query_cache.get(self._query_cache_key(query, k)) is None
+        ))
+        if not pending or not self.vector_store:
+            return
+        
+        try:
+            embeddings = np.asarray(self.embeddings.embed_documents(pending), dtype='float32')
+        except Exception as e:
+            logger.warning(f"⚠️ Batch embedding failed, retrieving per request: {e}")
+            return
+        
+        results = self.retrieve_relevant_docs_batch(pending, k, embeddings)
+        for query, docs, embedding in zip(pending, results, embeddings):
+            if docs:
+                self.query_cache.put(self._query_cache_key(query, k), (docs, embedding))
+    
+    def generate_schema_stream(self, requirements: str, dialect: str = "postgresql", conversation_context=None,
+                               existing_schema=None, project_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Generate a schema while streaming the LLM response section by section.
+        
+        Yields event dicts: 'context' once retrieval and reranking are done,
+        'section' for each piece of [SCHEMA]/[EXPLANATION]/... text as it
+        arrives, and finally 'done' with the same result generate_schema
+        returns (or 'error' with an error result).
+        """
+        start_time = time.perf_counter_ns()
+        self._log_existing_schema(existing_schema)
+        docs = []
+        
+        try:
+            dialect, error = self._resolve_dialect(dialect)
+            if error:
+                yield {"event": "error", "result": error}
+                return
             
-            'trino': """
-TRINO SPECIFIC REQUIREMENTS:
-- NO auto-increment columns (Trino doesn't support them)
-- Use BIGINT for ID columns with manual sequence generation
-- Design for distributed queries across multiple data sources
-- Include proper partitioning strategies (especially for Hive connector)
-- Use appropriate data types for the target connector
-- Consider bucketing for join optimization
-- Design schemas for cross-catalog queries
-- Include table properties for connector-specific optimizations
-- Focus on columnar storage optimization""",
+            docs, query_embedding = self.retrieve_for_query(requirements, k=5)
             
-            'spark': """
-SPARK SQL SPECIFIC REQUIREMENTS:
-- Design for Delta tables with ACID transactions
-- NO auto-increment (use monotonically_increasing_id() or UUID)
-- Include partitioning columns for distributed performance
-- Use appropriate Spark SQL data types (BIGINT, STRING, TIMESTAMP)
-- Consider schema evolution and backward compatibility
-- Design for both batch and streaming workloads
-- Include table properties for Delta optimizations
-- Use proper data layout for query performance
-- Consider Z-ordering for frequently queried columns"""
-        }
-        
-        return base_prompt + dialect_specifics.get(dialect, "")
+            if not docs:
+                yield {"event": "error", "result": self._error_result("No relevant documentation found. Please run db_setup.py first.")}
+                return
+            
+            reranked_docs = self._cached_rerank(requirements, docs, query_embedding)
+            yield {"event": "context", "dialect": dialect, "docs_retrieved": len(docs), "docs_used": len(reranked_docs)}
+            
+            messages = self._build_messages(requirements, reranked_docs, dialect, conversation_context, existing_schema)
+            
+            parser = SectionStreamParser()
+            response_key = self.response_cache.key(messages)
+            content = self.response_cache.get(response_key)
+            if content is not None:
+                logger.info("♻️ Reusing cached LLM response for an identical prompt")
+                for section, piece in parser.feed(content):
+                    yield {"event": "section", "section": section, "text": piece}
+            else:
+                # Sections are already sent by the time a truncation shows up, so a
+                # stream can't be retried with a bigger budget; use the cap up front
+                stream = self.groq_client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=MAX_TOKENS_CAP,
+                    stream=True
+                )
+                
+                chunks = []
+                finish_reason = None
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    text = chunk.choices[0].delta.content
+                    if not text:
+                        continue
+                    chunks.append(text)
+                    for section, piece in parser.feed(text):
+                        yield {"event": "section", "section": section, "text": piece}
+                
+                content = "".join(chunks)
+                self._cache_response(response_key, content, finish_reason)
+            for section, piece in parser.flush():
+                yield {"event": "section", "section": section, "text": piece}
+            
+            yield {"event": "done", "result": self._finish_generation(
+                requirements, content, dialect, docs, reranked_docs, start_time, project_id
+            )}
+            
+        except Exception as e:
+            yield {"event": "error", "result": self._failed_generation(requirements, e, docs, start_time)}
+    
+    def get_schema_prompt_template(self, dialect: str) -> str:
+        """Get dialect-specific system prompt for schema generation"""
+        return _SYSTEM_PROMPTS.get(dialect, self.SYSTEM_PROMPT)
     
     def create_schema_prompt(self, requirements: str, context: str, dialect: str, conversation_context=None, existing_schema=None) -> str:
         """Create dialect-specific prompt for schema generation"""
         dialect_features = self.get_dialect_features(dialect)
+        debug = logger.isEnabledFor(logging.DEBUG)
         
-        logger.info(f"\n{'='*80}")
-        logger.info(f"CREATE_SCHEMA_PROMPT - EXISTING SCHEMA CHECK")
-        logger.info(f"{'='*80}")
+        if debug:
+            logger.debug("\n%s\nCREATE_SCHEMA_PROMPT - EXISTING SCHEMA CHECK\n%s", _BANNER, _BANNER)
         
         # Add existing schema context
         existing_schema_section = ""
         if existing_schema and existing_schema.get('tables'):
             tables = existing_schema['tables']
-            logger.info(f"✅ Building existing schema section with {len(tables)} tables")
-            logger.info(f"   First 3 tables: {[t.get('name') for t in tables[:3]]}")
-            
-            existing_schema_section = f"\n{'='*80}\n"
-            existing_schema_section += f"EXISTING DATABASE SCHEMA - {len(tables)} TABLES\n"
-            existing_schema_section += f"{'='*80}\n\n"
-            existing_schema_section += "**The database currently has these tables:**\n\n"
-            for table in tables[:20]:  # Limit to 20 tables
-                table_name = table.get('name', 'unknown')
-                columns = table.get('columns', 'N/A')
-                existing_schema_section += f"TABLE: {table_name}\n"
-                existing_schema_section += f"  Columns: {columns}\n\n"
-            existing_schema_section += f"{'='*80}\n"
-            existing_schema_section += "**CRITICAL INSTRUCTIONS - MUST FOLLOW:**\n"
-            existing_schema_section += "1. The database ALREADY HAS these tables - DO NOT recreate them\n"
-            existing_schema_section += "2. ONLY create NEW tables that are requested\n"
-            existing_schema_section += "3. Use foreign keys to reference existing table IDs (e.g., user_id references users, product_id references products)\n"
-            existing_schema_section += "4. Follow the existing naming conventions (e.g., if tables use plural names, continue that pattern)\n"
-            existing_schema_section += "5. Keep it SIMPLE - do not add unnecessary OLAP, data warehouse, or complex structures unless specifically requested\n"
-            existing_schema_section += "6. Match the existing column naming style and data types\n"
-            existing_schema_section += f"{'='*80}\n\n"
-            
-            logger.info(f"✅ Existing schema section built ({len(existing_schema_section)} chars)")
-        else:
-            logger.info(f"❌ No existing schema to inject (existing_schema={existing_schema})")
+            if debug:
+                logger.debug("✅ Building existing schema section with %d tables", len(tables))
+                logger.debug("   First 3 tables: %s", [t.get('name') for t in tables[:3]])
+            
+            existing_schema_section = "".join([
+                _EXISTING_SCHEMA_HEADER.format(table_count=len(tables)),
+                # Limit to 20 tables
+                *(f"TABLE: {table.get('name', 'unknown')}\n  Columns: {table.get('columns', 'N/A')}\n\n" for table in tables[:20]),
+                _EXISTING_SCHEMA_INSTRUCTIONS
+            ])
+            
+            if debug:
+                logger.debug("✅ Existing schema section built (%d chars)", len(existing_schema_section))
+        elif debug:
+            logger.debug("❌ No existing schema to inject (existing_schema=%s)", existing_schema)
         
-        logger.info(f"{'='*80}\n")
+        if debug:
+            logger.debug("%s\n", _BANNER)
         
         # Add conversation context from Query Generator
         conversation_section = ""
         if conversation_context and conversation_context.get('queries'):
             queries = conversation_context['queries']
-            conversation_section = f"\n\n**PREVIOUSLY GENERATED QUERIES ({len(queries)}):**\n"
-            conversation_section += "The Query Generator has created the following SQL queries in this conversation:\n"
+            parts = [
+                f"\n\n**PREVIOUSLY GENERATED QUERIES ({len(queries)}):**\n",
+                "The Query Generator has created the following SQL queries in this conversation:\n"
+            ]
             for idx, query_item in enumerate(queries[-3:], 1):  # Last 3 queries to avoid token limits
                 query_sql = query_item.get('query', '')
                 if query_sql:
-                    conversation_section += f"\nQuery {idx}:\n```sql\n{query_sql[:300]}...\n```\n"
-            conversation_section += "\n**DESIGN SCHEMA to support these queries. Ensure tables, columns, and relationships match query requirements.**\n"
+                    parts.append(f"\nQuery {idx}:\n```sql\n{query_sql[:300]}...\n```\n")
+            parts.append("\n**DESIGN SCHEMA to support these queries. Ensure tables, columns, and relationships match query requirements.**\n")
+            conversation_section = "".join(parts)
         
         # Determine if this is an extension request or new schema request
         is_extension = existing_schema and existing_schema.get('tables')
         
-        if is_extension:
-            # Extending existing schema - prioritize simplicity and integration
-            return f"""You are extending an existing database schema.
-
-{existing_schema_section}
-
-**USER REQUEST:** {requirements}
-{conversation_section}
-
-Target Database: {dialect.upper()}
-Dialect Features: {', '.join(dialect_features)}
-
-**YOUR TASK:**
-Create ONLY the NEW tables requested. DO NOT recreate existing tables. Keep it simple and focused.
-
-Design guidelines:
-1. Create minimal tables needed to fulfill the request
-2. Reference existing tables using foreign keys (user_id → users.id, product_id → products.id, etc.)
-3. Match existing naming patterns and data types
-4. Use appropriate {dialect.upper()} syntax and features
-
-Reference documentation (use only if helpful for syntax/features):
-{context[:500]}...
-
-Please provide:
-1. CREATE TABLE statements with {dialect}-appropriate data types
-2. Primary keys, foreign keys, and constraints specific to {dialect}
-3. Indexing strategies optimized for {dialect}
-4. Partitioning recommendations if applicable for {dialect}
-5. Best practices specific to {dialect} database
-
-Focus on {dialect}-specific performance, scalability, and maintainability features."""
-        else:
-            # New schema from scratch
-            return f"""Based on the following database design documentation:
-
-{context}
-
-Target Database: {dialect.upper()}
-Dialect Features: {', '.join(dialect_features)}
-
-Requirements: {requirements}
-{conversation_section}
-
-Please design an optimal {dialect.upper()} database schema including:
-1. CREATE TABLE statements with {dialect}-appropriate data types
-2. Primary keys, foreign keys, and constraints specific to {dialect}
-3. Indexing strategies optimized for {dialect}
-4. Partitioning recommendations if applicable for {dialect}
-5. Best practices specific to {dialect} database
-
-Focus on {dialect}-specific performance, scalability, and maintainability features."""
+        # Extending existing schema - prioritize simplicity and integration;
+        # otherwise design a new schema from scratch
+        template = _EXTENSION_PROMPT_TEMPLATE if is_extension else _NEW_SCHEMA_PROMPT_TEMPLATE
+        return template.format(
+            existing_schema_section=existing_schema_section,
+            requirements=requirements,
+            conversation_section=conversation_section,
+            dialect=dialect,
+            dialect_upper=dialect.upper(),
+            dialect_features=', '.join(dialect_features),
+            context=context[:_EXTENSION_CONTEXT_CHARS] if is_extension else context
+        )
     
-    def get_dialect_features(self, dialect: str) -> List[str]:
+    def get_dialect_features(self, dialect: str) -> Tuple[str, ...]:
         """Get key features for each database dialect"""
-        features = {
-            'mysql': [
-                'AUTO_INCREMENT', 'InnoDB Engine', 'MyISAM Engine', 'CHARSET utf8mb4',
-                'Partitioning', 'Foreign Keys', 'Full-text Indexing', 'JSON data type'
-            ],
-            'postgresql': [
-                'SERIAL/IDENTITY', 'JSONB', 'Array Types', 'CTEs', 'Window Functions',
-                'Table Partitioning', 'Concurrent Indexing', 'Schemas/Namespaces'
-            ],
-            'trino': [
-                'Cross-catalog Queries', 'Connector-based', 'Distributed Joins',
-                'Bucketing', 'Table Properties', 'Columnar Storage', 'Push-down Optimization'
-            ],
-            'spark': [
-                'Delta Tables', 'Schema Evolution', 'Partitioning', 'Z-ordering',
-                'ACID Transactions', 'Time Travel', 'Streaming Support', 'Broadcast Joins'
-            ]
-        }
-        return features.get(dialect, [])
+        return _DIALECT_FEATURES.get(dialect, ())
     
     def parse_schema_response(self, content: str) -> tuple:
         """Parse the LLM response into schema, explanation, optimizations, and best_practices"""
@@ -518,38 +1630,23 @@ Focus on {dialect}-specific performance, scalability, and maintainability featur
             optimizations = ""
             best_practices = []
             
-            if "[SCHEMA]" in content:
-                parts = content.split("[SCHEMA]", 1)
-                if len(parts) > 1:
-                    remaining = parts[1]
-                    
-                    # Clean up markdown code fences that may have slipped in
-                    remaining = remaining.replace('```sql', '').replace('```', '')
-                    
-                    if "[EXPLANATION]" in remaining:
-                        schema_part, rest = remaining.split("[EXPLANATION]", 1)
-                        # Clean up the schema section
-                        schema = schema_part.strip()
-                        # Remove any lingering markdown artifacts
-                        schema = schema.replace('```sql', '').replace('```', '').strip()
-                        
-                        if "[OPTIMIZATIONS]" in rest:
-                            explanation_part, opt_rest = rest.split("[OPTIMIZATIONS]", 1)
-                            explanation = explanation_part.strip()
-                            
-                            if "[BEST_PRACTICES]" in opt_rest:
-                                opt_part, bp_part = opt_rest.split("[BEST_PRACTICES]", 1)
-                                optimizations = opt_part.strip()
-                                best_practices = self.parse_best_practices(bp_part.strip())
-                            else:
-                                optimizations = opt_rest.strip()
-                        else:
-                            explanation = rest.strip()
-                    else:
-                        schema = remaining.strip()
-            else:
+            _, found, remaining = content.partition("[SCHEMA]")
+            if not found:
                 # Fallback: use entire content as schema
-                schema = content.strip()
+                return content.strip(), explanation, optimizations, best_practices
+            
+            # Each partition scans only what follows the previous marker
+            schema, found, remaining = remaining.partition("[EXPLANATION]")
+            # Clean up markdown code fences that may have slipped into the DDL
+            schema = _FENCE_RE.sub('', schema).strip()
+            if found:
+                explanation, found, remaining = remaining.partition("[OPTIMIZATIONS]")
+                explanation = explanation.strip()
+                if found:
+                    optimizations, found, remaining = remaining.partition("[BEST_PRACTICES]")
+                    optimizations = optimizations.strip()
+                    if found:
+                        best_practices = self.parse_best_practices(remaining.strip())
             
             return schema, explanation, optimizations, best_practices
             
@@ -576,8 +1673,10 @@ Focus on {dialect}-specific performance, scalability, and maintainability featur
                         practices.append(current_practice)
                     
                     # Extract title (remove numbering/bullets)
-                    title = line.lstrip('0123456789.-* ').split(':')[0].strip()
-                    description = ':'.join(line.split(':')[1:]).strip() if ':' in line else line.lstrip('0123456789.-* ').strip()
+                    text = line.lstrip('0123456789.-* ')
+                    title, colon, description = text.partition(':')
+                    title = title.strip()
+                    description = description.strip() if colon else text.strip()
                     
                     current_practice = {
                         "title": title[:50],  # Limit title length
@@ -586,9 +1685,10 @@ Focus on {dialect}-specific performance, scalability, and maintainability featur
                     }
                     
                     # Categorize based on keywords
-                    if any(keyword in line.lower() for keyword in ['index', 'performance', 'optimize', 'speed']):
+                    lowered = line.lower()
+                    if _PERF_RE.search(lowered):
                         current_practice["category"] = "performance"
-                    elif any(keyword in line.lower() for keyword in ['security', 'auth', 'permission', 'access']):
+                    elif _SEC_RE.search(lowered):
                         current_practice["category"] = "security"
                 else:
                     # Continuation of current practice description
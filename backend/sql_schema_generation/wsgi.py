@@ -0,0 +1,10 @@
+"""
+WSGI entrypoint for the Schema Generation API
+
+Run with:
+    gunicorn -c gunicorn.conf.py wsgi:application
+"""
+
+from main_api import app
+
+application = app